@@ -0,0 +1,99 @@
+import hashlib
+import json
+import os
+
+# Records, per pipeline stage, the digest of every output's inputs (data plus
+# code and config version) and the digest of the output file itself, so a
+# rerun can skip anything whose inputs are unchanged and whose file is intact
+MANIFEST_PATH = '.pipeline_manifest.json'
+
+MANIFEST_VERSION = 1
+
+
+def new_digest():
+    return hashlib.blake2b(digest_size=16)
+
+
+def file_digest(path):
+    digest = new_digest()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def text_digest(*parts):
+    digest = new_digest()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def code_version(*paths):
+    # Digest of the source and config files a stage depends on. A missing file
+    # still contributes its name, so creating it later invalidates the stage
+    digest = new_digest()
+    for path in paths:
+        digest.update(os.path.basename(path).encode('utf-8'))
+        if os.path.exists(path):
+            digest.update(file_digest(path).encode('ascii'))
+    return digest.hexdigest()
+
+
+def load_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path, 'r') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        manifest = None
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable build manifest {path}: {e}")
+        manifest = None
+
+    if not manifest or manifest.get('version') != MANIFEST_VERSION:
+        manifest = {'version': MANIFEST_VERSION, 'stages': {}}
+    return manifest
+
+
+def save_manifest(manifest, path=MANIFEST_PATH):
+    # Write to a temporary file first so an interrupted run never leaves a
+    # truncated manifest behind
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _output_state(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _output_intact(path, recorded):
+    try:
+        state = _output_state(path)
+    except FileNotFoundError:
+        return False
+    if state['size'] != recorded['size']:
+        return False
+    # Only re-hash files that were touched since they were recorded
+    if state['mtime_ns'] == recorded['mtime_ns']:
+        return True
+    return file_digest(path) == recorded['digest']
+
+
+def is_fresh(manifest, stage, key, input_digest):
+    entry = manifest['stages'].get(stage, {}).get(key)
+    if entry is None or entry['inputs'] != input_digest:
+        return False
+    return all(_output_intact(path, recorded) for path, recorded in entry['outputs'].items())
+
+
+def record(manifest, stage, key, input_digest, outputs):
+    recorded_outputs = {}
+    for path in outputs:
+        state = _output_state(path)
+        state['digest'] = file_digest(path)
+        recorded_outputs[path] = state
+    manifest['stages'].setdefault(stage, {})[key] = {'inputs': input_digest, 'outputs': recorded_outputs}
@@ -0,0 +1,176 @@
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import BuildManifest
+import PitchConfig
+
+# Figure templates built by this process, keyed by chart kind. Each pool worker
+# is its own process and so builds (and then reuses) its own templates
+_templates = {}
+
+CHART_FORMATS = ['png', 'svg', 'pdf']
+DEFAULT_DPI = 150
+THUMBNAIL_DPI = 50
+
+# How this process writes charts: file format, raster resolution, and whether
+# each file is cropped to its drawn content (bbox_inches='tight', which costs
+# an extra layout pass per file) or saved at the figure's fixed size. Set with
+# set_output_options(); pool workers get the parent's options as they start
+_output = {'format': 'png', 'dpi': DEFAULT_DPI, 'tight': True}
+
+# Panels per row of a multi-pitcher sheet
+SHEET_COLUMNS = 4
+
+
+def pyplot():
+    # matplotlib is imported on the first chart, not when this module loads.
+    # Charts are only ever written to files, so never pick up a GUI backend
+    import matplotlib
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def set_output_options(fmt='png', dpi=DEFAULT_DPI, tight=True):
+    if fmt not in CHART_FORMATS:
+        raise ValueError(f"Unknown chart format '{fmt}', expected one of {', '.join(CHART_FORMATS)}")
+    _output.update({'format': fmt, 'dpi': dpi, 'tight': tight})
+
+
+def output_options():
+    return dict(_output)
+
+
+def chart_file(out_dir, name):
+    # Path of a chart file in the current output format
+    return os.path.join(out_dir, f"{name}.{_output['format']}")
+
+
+def get_figure(kind, figsize, margins=None):
+    # Return this process's figure/axes for a chart kind, cleared for redrawing.
+    # margins (subplots_adjust fractions) lay out the figure when charts are
+    # saved with a fixed bbox, leaving room for what sits outside the axes
+    if kind not in _templates:
+        _templates[kind] = pyplot().subplots(figsize=figsize)
+    fig, ax = _templates[kind]
+    ax.clear()
+    if margins and not _output['tight']:
+        fig.subplots_adjust(**margins)
+    return fig, ax
+
+
+def sheet_figure(panels, panel_size, legend_width=1.5):
+    # A new figure holding `panels` axes in a grid of up to SHEET_COLUMNS per
+    # row, with a column of legend_width inches on the right for a shared
+    # legend. Returns (fig, axes, legend_x): axes in reading order, the unused
+    # grid cells already removed, and the figure x where the legend starts
+    columns = min(panels, SHEET_COLUMNS)
+    rows = math.ceil(panels / columns)
+    width = columns * panel_size + legend_width
+    height = rows * panel_size + 0.6
+    fig, grid = pyplot().subplots(rows, columns, figsize=(width, height), squeeze=False)
+    legend_x = 1 - legend_width / width
+    fig.subplots_adjust(left=0.6 / width, right=legend_x - 0.2 / width, bottom=0.4 / height,
+                        top=1 - 0.6 / height, wspace=0.3, hspace=0.35)
+    axes = list(grid.flat)
+    for ax in axes[panels:]:
+        fig.delaxes(ax)
+    return fig, axes[:panels], legend_x
+
+
+def group_by_game(jobs, game_of):
+    # Jobs grouped into (game_id, [jobs]) in order of each game's first job
+    games = {}
+    for job in jobs:
+        games.setdefault(game_of(job), []).append(job)
+    return list(games.items())
+
+
+def stage_version(*module_files):
+    # Code/config version of a chart stage: its modules, this renderer and the colors
+    return BuildManifest.code_version(*module_files, __file__, PitchConfig.__file__, PitchConfig.CONFIG_PATH)
+
+
+def chart_game_id(game_id):
+    # Game ids from file names are ints; keep any other id as it is
+    return int(game_id) if str(game_id).isdigit() else game_id
+
+
+def save_figure(fig, outfile, dpi=None):
+    # The format follows outfile's extension; dpi only matters for rasters
+    os.makedirs(os.path.dirname(outfile) or '.', exist_ok=True)
+    fig.savefig(outfile, bbox_inches='tight' if _output['tight'] else None, dpi=dpi or _output['dpi'])
+
+
+def close_figure(fig):
+    # Sheets are one-off figures, unlike the per-kind templates
+    pyplot().close(fig)
+
+
+def _init_worker(options):
+    PitchConfig.load_config()
+    set_output_options(options['format'], options['dpi'], options['tight'])
+
+
+def _render_job(task):
+    render_fn, args = task
+    return render_fn(*args)
+
+
+def render_jobs(render_fn, jobs, workers=1):
+    # Call render_fn(*job) for every job, spread over `workers` processes.
+    # render_fn must be a module-level function so it can be sent to workers.
+    # The color config is loaded (and validated) here first, and once by each
+    # worker as it starts, so no chart reads it. Workers also take this
+    # process's output options
+    jobs = list(jobs)
+    PitchConfig.load_config()
+    if workers <= 1 or len(jobs) <= 1:
+        return [render_fn(*job) for job in jobs]
+
+    chunksize = max(1, len(jobs) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(output_options(),)) as pool:
+        return list(pool.map(_render_job, [(render_fn, job) for job in jobs], chunksize=chunksize))
+
+
+def render_stale_jobs(render_fn, jobs, workers, manifest, stage, version, output_path):
+    # Like render_jobs, but skips jobs whose chart is recorded in the manifest with
+    # the same inputs. output_path(job) names the chart a job writes; render_fn
+    # returns the path it wrote (or None when there was nothing to draw).
+    # A chart drawn at another resolution or bbox is not fresh either
+    version = BuildManifest.text_digest(version, json.dumps(output_options(), sort_keys=True))
+    pending = []
+    for job in jobs:
+        key = output_path(job)
+        digest = BuildManifest.text_digest(version, json.dumps(job, sort_keys=True, default=str))
+        if not BuildManifest.is_fresh(manifest, stage, key, digest):
+            pending.append((job, key, digest))
+
+    written = render_jobs(render_fn, [job for job, _, _ in pending], workers)
+    for (job, key, digest), outfile in zip(pending, written):
+        BuildManifest.record(manifest, stage, key, digest, [outfile] if outfile else [])
+    return written
+
+
+def add_arguments(parser):
+    # The chart output flags of every chart-rendering script
+    parser.add_argument('--batch', action='store_true',
+                        help="draw all of a game's pitchers on one multi-panel sheet instead of one file each")
+    parser.add_argument('--chart-format', choices=CHART_FORMATS, default='png',
+                        help='chart file format (default: %(default)s)')
+    resolution = parser.add_mutually_exclusive_group()
+    resolution.add_argument('--dpi', type=int, default=DEFAULT_DPI,
+                            help='resolution of raster charts (default: %(default)s)')
+    resolution.add_argument('--thumbnail', action='store_const', dest='dpi', const=THUMBNAIL_DPI,
+                            help=f'render raster charts at {THUMBNAIL_DPI} dpi')
+    parser.add_argument('--fixed-bbox', action='store_true',
+                        help='save charts at their fixed figure size instead of cropping each file to its content')
+
+
+def set_output_from_args(parser, args):
+    if args.dpi <= 0:
+        parser.error('--dpi must be positive')
+    set_output_options(args.chart_format, args.dpi, not args.fixed_bbox)
@@ -0,0 +1,209 @@
+import argparse
+import csv
+import os
+import LazyImport
+import PitchStorage
+import StageMetrics
+from PitcherResultsGenerator import PITCH_TYPES, counted_pitches, load_game
+
+pd = LazyImport.lazy_module('pandas')
+np = LazyImport.lazy_module('numpy')
+
+# Batter-side counterpart of the pitcher results: one line per BatterId per
+# game, built in a single groupby pass over the same parsed game (GameContext)
+# the pitcher outputs use
+
+HIT_CALLS = {'single': '1B', 'double': '2B', 'triple': '3B', 'home_run': 'HR'}
+
+# Plate appearances that do not count as at-bats
+NON_AT_BAT_CALLS = ['walk', 'hit_by_pitch', 'sac_bunt', 'sac_fly', 'catcher_interf']
+
+# Swings and misses. foul_tip counts as a whiff, as in Statcast. 'strikeout'
+# replaces the final pitch's call, so whether that pitch was swung at is not
+# known and it counts as neither a swing nor a whiff
+WHIFF_CALLS = ['swinging_strike', 'swinging_strike_blocked', 'foul_tip']
+SWING_CALLS = WHIFF_CALLS + [
+    'foul', 'foul_bunt', 'field_out', 'force_out', 'grounded_into_double_play', 'field_error',
+    'single', 'double', 'triple', 'home_run', 'sac_bunt', 'sac_fly'
+]
+
+PITCHER_HANDS = ['L', 'R']
+
+# Additive counters per batter; everything in the results file derives from these
+HITTER_COUNT_COLUMNS = (
+    ['PA', 'NonAtBats', '1B', '2B', '3B', 'HR', 'Strikeouts', 'Walks', 'Pitches', 'Swings', 'Whiffs']
+    + [f"{pitch_type}{suffix}" for pitch_type in PITCH_TYPES for suffix in ('', '_Swings', '_Whiffs', '_H')]
+    + [f"vs{hand}_{counter}" for hand in PITCHER_HANDS for counter in ('PA', 'NonAtBats', 'H')]
+)
+
+HITTER_RESULTS_HEADERS = (
+    ['BatterId', 'BatterSide', 'PA', 'AB', '1B', '2B', '3B', 'HR', 'Hits', 'Strikeouts', 'Walks', 'AVG',
+     'Pitches', 'Swings', 'Whiffs', 'Whiff%']
+    + [f"{pitch_type}{suffix}" for pitch_type in PITCH_TYPES for suffix in ('', '_Whiff%', '_H')]
+    + [f"vs{hand}_{column}" for hand in PITCHER_HANDS for column in ('PA', 'AB', 'H', 'AVG')]
+)
+
+def calculate_hitter_counts(df, keys=('BatterId',)):
+    # Columnar pass over every pitch: one row of additive counters per batter
+    # (or per group of keys, e.g. ('GamePk', 'BatterId') for a whole season),
+    # ordered by key
+    keys = list(keys)
+    df = df.dropna(subset=keys)
+    group_keys = [df[k] for k in keys]
+
+    calls = df['PitchCall']
+    # A pitch counts once per at-bat even when pickoffs repeat its PitchNumber
+    pitch = counted_pitches(df, group_keys + [df['AtBatNumber']])
+    # The first row of each of the batter's at-bats marks a plate appearance
+    new_pa = ~df.duplicated(subset=keys + ['AtBatNumber']).to_numpy()
+    non_at_bat = calls.isin(NON_AT_BAT_CALLS).to_numpy()
+    swing = pitch & calls.isin(SWING_CALLS).to_numpy()
+    whiff = pitch & calls.isin(WHIFF_CALLS).to_numpy()
+    hit = calls.isin(list(HIT_CALLS)).to_numpy()
+
+    columns = {
+        'PA': new_pa,
+        'NonAtBats': non_at_bat,
+        'Strikeouts': (calls == 'strikeout').to_numpy(),
+        'Walks': (calls == 'walk').to_numpy(),
+        'Pitches': pitch,
+        'Swings': swing,
+        'Whiffs': whiff,
+    }
+    for call, column in HIT_CALLS.items():
+        columns[column] = (calls == call).to_numpy()
+
+    type_codes = pd.Index(PITCH_TYPES).get_indexer(df['PitchType'])
+    for code, pitch_type in enumerate(PITCH_TYPES):
+        is_type = type_codes == code
+        columns[pitch_type] = pitch & is_type
+        columns[f"{pitch_type}_Swings"] = swing & is_type
+        columns[f"{pitch_type}_Whiffs"] = whiff & is_type
+        columns[f"{pitch_type}_H"] = hit & is_type
+
+    hands = df['PitcherHand'].to_numpy()
+    for hand in PITCHER_HANDS:
+        is_hand = hands == hand
+        columns[f"vs{hand}_PA"] = new_pa & is_hand
+        columns[f"vs{hand}_NonAtBats"] = non_at_bat & is_hand
+        columns[f"vs{hand}_H"] = hit & is_hand
+
+    counts = pd.DataFrame(columns, index=df.index).groupby(group_keys, sort=False).sum()
+    first_rows = df.groupby(group_keys, sort=False)['BatterSide'].nth(0)
+    counts['BatterSide'] = first_rows.to_numpy()
+    return counts.sort_index()
+
+def derive_hitter_stats(batter_id, counts):
+    # Turn one batter's counters into the HitterResults row
+    pa = int(counts['PA'])
+    at_bats = pa - int(counts['NonAtBats'])
+    hits = sum(int(counts[column]) for column in HIT_CALLS.values())
+    swings = int(counts['Swings'])
+    whiffs = int(counts['Whiffs'])
+
+    stats = {
+        'BatterId': batter_id,
+        'BatterSide': counts['BatterSide'],
+        'PA': pa,
+        'AB': at_bats,
+        'Hits': hits,
+        'Strikeouts': int(counts['Strikeouts']),
+        'Walks': int(counts['Walks']),
+        'AVG': round(hits / at_bats, 3) if at_bats > 0 else 0,
+        'Pitches': int(counts['Pitches']),
+        'Swings': swings,
+        'Whiffs': whiffs,
+        'Whiff%': round((whiffs / swings) * 100, 1) if swings > 0 else 0,
+    }
+    for column in HIT_CALLS.values():
+        stats[column] = int(counts[column])
+
+    # Pitches seen, whiff rate and hits for each pitch type
+    for pitch_type in PITCH_TYPES:
+        type_swings = int(counts[f"{pitch_type}_Swings"])
+        type_whiffs = int(counts[f"{pitch_type}_Whiffs"])
+        stats[pitch_type] = int(counts[pitch_type])
+        stats[f"{pitch_type}_Whiff%"] = round((type_whiffs / type_swings) * 100, 1) if type_swings > 0 else 0
+        stats[f"{pitch_type}_H"] = int(counts[f"{pitch_type}_H"])
+
+    # Splits by pitcher hand
+    for hand in PITCHER_HANDS:
+        hand_at_bats = int(counts[f"vs{hand}_PA"]) - int(counts[f"vs{hand}_NonAtBats"])
+        hand_hits = int(counts[f"vs{hand}_H"])
+        stats[f"vs{hand}_PA"] = int(counts[f"vs{hand}_PA"])
+        stats[f"vs{hand}_AB"] = hand_at_bats
+        stats[f"vs{hand}_H"] = hand_hits
+        stats[f"vs{hand}_AVG"] = round(hand_hits / hand_at_bats, 3) if hand_at_bats > 0 else 0
+
+    return stats
+
+@StageMetrics.instrument
+def calculate_hitter_stats(game_file, game_id, game=None):
+
+    if game is None:
+        game = load_game(game_file, game_id)
+
+    counts = calculate_hitter_counts(game.df)
+
+    hitter_stats = {}
+    for batter_id, batter_counts in zip(counts.index, counts.to_dict('records')):
+        hitter_stats[batter_id] = derive_hitter_stats(batter_id, batter_counts)
+
+    StageMetrics.note(game=game_id, rows_in=len(game), rows_out=len(hitter_stats))
+    return hitter_stats
+
+def hitter_results_path(game_id, output_dir='HitterGameResults', fmt='csv'):
+    return PitchStorage.table_path(os.path.join(output_dir, f"HitterResultsGame{game_id}"), fmt)
+
+def create_hitter_results_csv(game_file, game_id, output_dir='HitterGameResults', game=None, fmt='csv', hitter_stats=None):
+
+    os.makedirs(output_dir, exist_ok=True)
+
+    if hitter_stats is None:
+        hitter_stats = calculate_hitter_stats(game_file, game_id, game)
+
+    headers = HITTER_RESULTS_HEADERS
+
+    if PitchStorage.resolve_format(fmt) != 'csv':
+        base_path = os.path.join(output_dir, f"HitterResultsGame{game_id}")
+        return PitchStorage.write_table(pd.DataFrame(list(hitter_stats.values()), columns=headers), base_path, fmt)
+
+    output_path = hitter_results_path(game_id, output_dir)
+
+    with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=headers)
+        writer.writeheader()
+
+        for batter_id, stats in hitter_stats.items():
+            writer.writerow(stats)
+
+    return output_path
+
+def process_all_games(games_dir='gamesSorted', fmt='csv'):
+
+    if not os.path.exists(games_dir):
+        print(f"Directory {games_dir} does not exist")
+        return
+
+    for filename in PitchStorage.list_tables(games_dir):
+        game_id = PitchStorage.strip_extension(filename).replace('game_', '')
+        game_file = os.path.join(games_dir, filename)
+        try:
+            create_hitter_results_csv(game_file, game_id, fmt=fmt)
+        except Exception as e:
+            print(f"Error processing hitter results for {filename}: {str(e)}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate per-game hitter results files')
+    parser.add_argument('--games-dir', default='gamesSorted')
+    parser.add_argument('--format', choices=PitchStorage.FORMATS, default='csv',
+                        help='storage format for the results tables (default: %(default)s)')
+    StageMetrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    StageMetrics.start_from_args(args)
+    process_all_games(args.games_dir, args.format)
+    StageMetrics.finish_from_args(args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import importlib
+
+# Heavy dependencies (pandas, numpy, pyarrow) cost hundreds of milliseconds to
+# import, which dominates short per-game jobs and incremental reruns that end
+# up with nothing to do. A LazyModule stands in for the module and imports it
+# on the first attribute access, e.g.
+#   pd = lazy_module('pandas')
+#   pd.read_csv(...)  # pandas is imported here
+
+
+class LazyModule:
+    def __init__(self, name):
+        self.__dict__['_lazy_name'] = name
+
+    def __getattr__(self, attr):
+        # Only called for names not yet in the instance dict, i.e. before the
+        # import (later lookups hit the copied names directly)
+        module = importlib.import_module(self.__dict__['_lazy_name'])
+        self.__dict__.update(module.__dict__)
+        return getattr(module, attr)
+
+    def __repr__(self):
+        return f"<lazy module '{self.__dict__['_lazy_name']}'>"
+
+
+def lazy_module(name):
+    return LazyModule(name)
@@ -0,0 +1,246 @@
+import argparse
+import csv
+import filecmp
+import math
+import os
+import time
+
+import PitchStorage
+from PitcherResultsGenerator import (CSV_NA_VALUES, PARTIAL_COUNT_COLUMNS, PITCH_TYPES, RESULT_COLUMNS,
+                                     RESULT_RULES, STRIKE_CALLS, create_pitcher_results_csv, derive_pitcher_stats)
+
+# Live, pitch-by-pitch version of the per-game pitcher results. Rows are fed
+# one at a time, in AtBatNumber/PitchNumber order within each game (the order
+# of the sorted game files), and each one updates its pitcher's running
+# counters in constant time with the rules of calculate_pitcher_stats:
+#   - every row credits its PitchCall's results counters
+#   - a row is a pitch when its PitchNumber differs from the pitcher's previous
+#     numbered row (pickoffs and stolen bases repeat it)
+#   - batters faced is the number of distinct at-bats
+#   - PitcherTeam and PitcherHand come from the pitcher's first row
+# Rows the sorter would drop (no GamePk or AtBatNumber) and rows without a
+# PitcherId are ignored, so a finished game's snapshot equals the batch results
+
+NA_VALUES = set(CSV_NA_VALUES)
+STRIKE_SET = set(STRIKE_CALLS)
+PITCH_TYPE_SET = set(PITCH_TYPES)
+
+
+def _text(value):
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return None
+    value = str(value)
+    return None if value in NA_VALUES else value
+
+
+def _int(value):
+    value = _text(value)
+    return None if value is None else int(float(value))
+
+
+class LiveTracker:
+
+    def __init__(self):
+        # game_id -> {pitcher_id: running state}, pitchers in order of first pitch
+        self.games = {}
+        # game_id -> (AtBatNumber, PitchNumber) of the game's latest row
+        self.positions = {}
+
+    def add_pitch(self, row):
+        # Apply one feed row (a mapping of column -> csv text or value).
+        # Returns (game_id, pitcher_id) of the updated pitcher, or None when the
+        # row is ignored. Raises ValueError for a row older than the game's last
+        game_id = _text(row.get('GamePk'))
+        at_bat = _int(row.get('AtBatNumber'))
+        if game_id is None or at_bat is None:
+            return None
+
+        pitch_number = _int(row.get('PitchNumber'))
+        position = (at_bat, -1 if pitch_number is None else pitch_number)
+        last = self.positions.get(game_id)
+        if last is not None and position < last:
+            raise ValueError(f"Game {game_id}: pitch {position} arrived after {last}")
+        self.positions[game_id] = position
+
+        pitcher_id = _int(row.get('PitcherId'))
+        if pitcher_id is None:
+            return None
+
+        pitchers = self.games.setdefault(game_id, {})
+        state = pitchers.get(pitcher_id)
+        if state is None:
+            # Missing hand stays NaN, as in the batch counters
+            hand = _text(row.get('PitcherHand'))
+            state = pitchers[pitcher_id] = {
+                'counts': dict.fromkeys(RESULT_COLUMNS + PARTIAL_COUNT_COLUMNS, 0),
+                'at_bats': set(),
+                'last_pitch_number': None,
+                'PitcherTeam': 1 if _int(row.get('IsTop')) == 1 else 2,
+                'PitcherHand': math.nan if hand is None else hand,
+            }
+
+        counts = state['counts']
+        call = _text(row.get('PitchCall'))
+        for column, amount in RESULT_RULES.get(call, {}).items():
+            counts[column] += amount
+
+        if pitch_number is not None and pitch_number != state['last_pitch_number']:
+            strike = call in STRIKE_SET
+            counts['TotalPitches'] += 1
+            counts['Strikes'] += strike
+            pitch_type = _text(row.get('PitchType'))
+            if pitch_type in PITCH_TYPE_SET:
+                counts[pitch_type] += 1
+                counts[f"{pitch_type}_Strikes"] += strike
+        if pitch_number is not None:
+            state['last_pitch_number'] = pitch_number
+
+        state['at_bats'].add(at_bat)
+        return game_id, pitcher_id
+
+    def pitcher_stats(self, game_id, pitcher_id):
+        # Current results row of one pitcher
+        state = self.games[game_id][pitcher_id]
+        counts = dict(state['counts'], TotalBattersFaced=len(state['at_bats']),
+                      PitcherTeam=state['PitcherTeam'], PitcherHand=state['PitcherHand'])
+        return derive_pitcher_stats(pitcher_id, counts)
+
+    def snapshot(self, game_id):
+        # Current results of every pitcher of a game, as calculate_pitcher_stats
+        # returns them for the finished game
+        return {pitcher_id: self.pitcher_stats(game_id, pitcher_id) for pitcher_id in self.games.get(game_id, {})}
+
+
+def read_feed_in_order(source_csv):
+    # The feed's rows as dicts, each game's rows sorted like the sorted game
+    # files (stably by AtBatNumber, PitchNumber), games in order of first row
+    games = {}
+    with open(source_csv, 'r', newline='') as src:
+        for row in csv.DictReader(src):
+            if row.get('GamePk') and row.get('AtBatNumber'):
+                games.setdefault(row['GamePk'], []).append(row)
+    for rows in games.values():
+        rows.sort(key=lambda r: (int(r['AtBatNumber']), int(r['PitchNumber'])))
+        yield from rows
+
+
+def follow_csv(path, poll_interval=0.05, idle_timeout=None):
+    # Rows appended to a growing CSV file, as dicts, as soon as each line is
+    # complete: a stand-in for a socket feed. The first line is the header.
+    # Stops after idle_timeout seconds without new data (None: never)
+    header = None
+    pending = ''
+    idle = 0.0
+    with open(path, 'r', newline='') as f:
+        while True:
+            chunk = f.readline()
+            if not chunk:
+                if idle_timeout is not None and idle >= idle_timeout:
+                    return
+                time.sleep(poll_interval)
+                idle += poll_interval
+                continue
+            idle = 0.0
+            pending += chunk
+            if not pending.endswith('\n'):
+                continue
+            fields = next(csv.reader([pending]))
+            pending = ''
+            if header is None:
+                header = fields
+            elif fields:
+                yield dict(zip(header, fields))
+
+
+def format_line(game_id, stats):
+    return (f"game {game_id} pitcher {stats['PitcherId']}: {stats['TotalPitches']} pitches, "
+            f"{stats['Strikes']} strikes, {stats['InningsPitched']} IP, {stats['Strikeouts']} K, "
+            f"{stats['Walks']} BB, BAA {stats['BAA']}, WHIP {stats['WHIP']}")
+
+
+def replay(source_csv, rate=0.0, every=0, output_dir='LiveGameResults', compare_dir='PitcherGameResults'):
+    # Feed the source through a LiveTracker at `rate` pitches per second
+    # (0: as fast as possible), refreshing the updated pitcher's stats after
+    # every pitch. Writes each game's final snapshot as a results file and
+    # compares it with the batch file of the same game in compare_dir.
+    # Returns the ids of games whose results differ from the batch ones
+    tracker = LiveTracker()
+    latencies = []
+    start = time.perf_counter()
+    for n, row in enumerate(read_feed_in_order(source_csv), 1):
+        if rate > 0:
+            delay = start + n / rate - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+        update_start = time.perf_counter()
+        updated = tracker.add_pitch(row)
+        if updated is None:
+            continue
+        stats = tracker.pitcher_stats(*updated)
+        latencies.append(time.perf_counter() - update_start)
+
+        if every and len(latencies) % every == 0:
+            print(format_line(updated[0], stats))
+
+    if latencies:
+        latencies.sort()
+        print(f"{len(latencies)} pitches, update + snapshot latency: "
+              f"median {latencies[len(latencies) // 2] * 1e6:.1f} us, max {latencies[-1] * 1e6:.1f} us")
+
+    mismatched = []
+    for game_id in tracker.games:
+        live_path = create_pitcher_results_csv(None, game_id, output_dir, pitcher_stats=tracker.snapshot(game_id))
+        batch_path = PitchStorage.table_path(os.path.join(compare_dir, f"PitcherResultsGame{game_id}"), 'csv')
+        if not os.path.exists(batch_path):
+            print(f"Game {game_id}: {live_path} written (no batch results to compare with)")
+        elif filecmp.cmp(live_path, batch_path, shallow=False):
+            print(f"Game {game_id}: live results match {batch_path}")
+        else:
+            print(f"Game {game_id}: live results DIFFER from {batch_path}")
+            mismatched.append(game_id)
+    return mismatched
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Live pitch-by-pitch pitcher results')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    replay_parser = commands.add_parser('replay', help='replay a feed file and compare with the batch results')
+    replay_parser.add_argument('--input', default='AnalyticsQuestionnairePitchData.csv')
+    replay_parser.add_argument('--rate', type=float, default=0.0,
+                               help='pitches per second (default: %(default)s, as fast as possible)')
+    replay_parser.add_argument('--every', type=int, default=0, help='print the updated pitcher every N pitches')
+    replay_parser.add_argument('--output-dir', default='LiveGameResults')
+    replay_parser.add_argument('--compare-dir', default='PitcherGameResults')
+
+    follow_parser = commands.add_parser('follow', help='update from rows appended to a csv file')
+    follow_parser.add_argument('path')
+    follow_parser.add_argument('--poll', type=float, default=0.05, help='seconds between checks for new rows')
+    follow_parser.add_argument('--idle-timeout', type=float, help='stop after this many seconds without new rows')
+    args = parser.parse_args()
+
+    if args.command == 'replay':
+        if not os.path.exists(args.input):
+            print(f"{args.input} not found")
+            return
+        if replay(args.input, args.rate, args.every, args.output_dir, args.compare_dir):
+            raise SystemExit(1)
+        return
+
+    tracker = LiveTracker()
+    try:
+        for row in follow_csv(args.path, args.poll, args.idle_timeout):
+            try:
+                updated = tracker.add_pitch(row)
+            except ValueError as e:
+                print(f"Skipping row: {e}")
+                continue
+            if updated is not None:
+                print(format_line(updated[0], tracker.pitcher_stats(*updated)), flush=True)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
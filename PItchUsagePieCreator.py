@@ -1,104 +1,198 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+import argparse
 import os
 import re
-import json
+import BuildManifest
+import LazyImport
+import PitchConfig
+import PitchStorage
+import ChartRenderer
+import StageMetrics
+from ChartRenderer import get_figure, save_figure, render_jobs
 
-def load_pitch_colors():
-    try: 
-        config_path = os.path.join('PitchColors.json')
-        with open(config_path, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Pitch color load failed.")
-        return {}
+pd = LazyImport.lazy_module('pandas')
 
-def create_pie_charts(pitch_usage):
-    colors_map = load_pitch_colors()
+# Count columns drawn as wedges, in drawing order
+PITCH_KEYS = ['FF', 'SI', 'FC', 'CU', 'CH', 'SL', 'KC']
 
-    pitcher_id = pitch_usage['PitcherId']
-    game_id = pitch_usage['GameId']
-    total_pitches = pitch_usage['TotalPitches']
+# Layout of a single chart saved with a fixed bbox
+USAGE_MARGINS = {'left': 0.05, 'right': 0.95, 'bottom': 0.05, 'top': 0.92}
+
+def usage_chart_path(game_id, pitcher_id, out_dir='PitchUsageCharts'):
+    return ChartRenderer.chart_file(out_dir, f'pitch_usage_game{game_id}_pitcher{pitcher_id}')
 
-    pitch_keys = ['FF', 'SI', 'FC', 'CU', 'CH', 'SL', 'KC']
+def usage_sheet_path(game_id, out_dir='PitchUsageCharts'):
+    return ChartRenderer.chart_file(out_dir, f'pitch_usage_game{game_id}')
 
+def usage_wedges(pitch_usage):
+    # (labels, sizes): the pitcher's pitch types and their share of all pitches
     labels = []
     sizes = []
-    colors = []
     
-    for k in pitch_keys:
+    for k in PITCH_KEYS:
         count = pitch_usage.get(k, 0)
         if count > 0:
             labels.append(k)
             # Calculate percentage of total pitches
-            percentage = (count / total_pitches) * 100
+            percentage = (count / pitch_usage['TotalPitches']) * 100
             sizes.append(percentage)
-            colors.append(colors_map.get(k, '#999999'))
+    return labels, sizes
+
+@StageMetrics.instrument
+def create_pie_charts(pitch_usage):
+    config = PitchConfig.load_config()
+
+    pitcher_id = pitch_usage['PitcherId']
+    game_id = pitch_usage['GameId']
+    total_pitches = pitch_usage['TotalPitches']
+    StageMetrics.note(game=game_id, pitcher=pitcher_id, rows_in=total_pitches)
 
+    labels, sizes = usage_wedges(pitch_usage)
     if not sizes:
-        return
+        return None
 
-    fig, ax = plt.subplots(figsize=(6,6))
-    plt.pie(
+    fig, ax = get_figure('usage', (6, 6), USAGE_MARGINS)
+    ax.pie(
         sizes,
         labels = labels,
-        colors = colors,
+        colors = config.rgba_array(labels),
         autopct='%1.1f%%',
         startangle=90,
         counterclock=False
     )
-    plt.title(f"Pitch Usage: Game {game_id} - Pitcher {pitcher_id}")
+    ax.set_title(f"Pitch Usage: Game {game_id} - Pitcher {pitcher_id}")
 
-    out_dir = 'PitchUsageCharts'
-    os.makedirs(out_dir, exist_ok=True)
-    outfile = os.path.join(out_dir, f'pitch_usage_game{game_id}_pitcher{pitcher_id}.png')
-    plt.savefig(outfile, bbox_inches='tight', dpi=150)
-    plt.close(fig)
+    outfile = usage_chart_path(game_id, pitcher_id)
+    save_figure(fig, outfile)
+    StageMetrics.note(rows_out=1)
 
     print(pitch_usage)
-
-
-def get_pitcher_data(games_dir='PitcherGameResults'):
+    return outfile
+
+@StageMetrics.instrument
+def create_usage_sheet(game_id, jobs):
+    # Every pitcher of a game (usage_jobs tuples) as one pie each on a single
+    # figure. Wedges carry only their percentage; one legend names the types
+    config = PitchConfig.load_config()
+    StageMetrics.note(game=game_id, pitchers=len(jobs))
+
+    pies = [(usage, *usage_wedges(usage)) for (usage,) in jobs]
+    pies = [pie for pie in pies if pie[2]]
+    if not pies:
+        return None
+
+    fig, axes, legend_x = ChartRenderer.sheet_figure(len(pies), 3, legend_width=1.0)
+    for ax, (usage, labels, sizes) in zip(axes, pies):
+        ax.pie(sizes, colors=config.rgba_array(labels), autopct='%1.1f%%', startangle=90, counterclock=False,
+               textprops={'fontsize': 8})
+        ax.set_title(f"Pitcher {usage['PitcherId']}", fontsize=10)
+
+    drawn = {label for _, labels, _ in pies for label in labels}
+    pitch_types = [k for k in PITCH_KEYS if k in drawn]
+    fig.suptitle(f"Pitch Usage: Game {game_id}", fontsize=14)
+    fig.legend(handles=config.legend_handles(pitch_types), loc='upper left', bbox_to_anchor=(legend_x, 0.95))
+
+    outfile = usage_sheet_path(game_id)
+    save_figure(fig, outfile)
+    ChartRenderer.close_figure(fig)
+    StageMetrics.note(rows_out=len(pies))
+    return outfile
+
+
+def pitch_usage(game_id, pitcher_id, counts):
+    # One pitcher's chart input from any mapping of TotalPitches and per-type
+    # counts: a calculate_pitcher_stats row, a results table row, ...
+    usage = {'GameId': ChartRenderer.chart_game_id(game_id), 'PitcherId': int(pitcher_id),
+             'TotalPitches': int(counts.get('TotalPitches', 0))}
+    usage.update({pitch_type: int(counts.get(pitch_type, 0)) for pitch_type in PITCH_KEYS})
+    return usage
+
+def usage_jobs(game_id, pitcher_stats):
+    # Chart jobs straight from calculate_pitcher_stats' {pitcher_id: stats}
+    return [(pitch_usage(game_id, pitcher_id, stats),) for pitcher_id, stats in pitcher_stats.items()]
+
+def usage_jobs_from_table(game_file, game_id):
+    # Chart jobs from a PitcherResultsGame table, for when the stats are no
+    # longer in memory. One row per pitcher (the first, if repeated); missing
+    # or unreadable counts are 0
+    df = PitchStorage.read_table(game_file)
+    df = df[pd.to_numeric(df['PitcherId'], errors='coerce').notna()].drop_duplicates('PitcherId')
+
+    columns = {}
+    for column in ['TotalPitches'] + PITCH_KEYS:
+        if column in df.columns:
+            columns[column] = pd.to_numeric(df[column], errors='coerce').fillna(0).astype('int64').tolist()
+        else:
+            columns[column] = [0] * len(df)
+
+    jobs = []
+    for i, pitcher_id in enumerate(pd.to_numeric(df['PitcherId']).tolist()):
+        jobs.append((pitch_usage(game_id, pitcher_id, {column: values[i] for column, values in columns.items()}),))
+    return jobs
+
+def render_usage_charts(jobs, workers=1, manifest=None, batch=False):
+    # Render usage_jobs / usage_jobs_from_table output, one file per pitcher
+    # or, with batch, one sheet per game; with a build manifest, only the
+    # charts whose counts changed
+    if batch:
+        return render_usage_sheets(jobs, workers, manifest)
+    if manifest is None:
+        return render_jobs(create_pie_charts, jobs, workers)
+    return ChartRenderer.render_stale_jobs(create_pie_charts, jobs, workers, manifest, 'usage_charts',
+                                           ChartRenderer.stage_version(__file__, PitchStorage.__file__),
+                                           lambda job: usage_chart_path(job[0]['GameId'], job[0]['PitcherId']))
+
+def render_usage_sheets(jobs, workers=1, manifest=None):
+    sheets = ChartRenderer.group_by_game(jobs, lambda job: job[0]['GameId'])
+    if manifest is None:
+        return render_jobs(create_usage_sheet, sheets, workers)
+    return ChartRenderer.render_stale_jobs(create_usage_sheet, sheets, workers, manifest, 'usage_sheets',
+                                           ChartRenderer.stage_version(__file__, PitchStorage.__file__),
+                                           lambda sheet: usage_sheet_path(sheet[0]))
+
+def get_pitcher_data(games_dir='PitcherGameResults', workers=1, manifest=None, batch=False):
+    # Fallback that recovers the counts from the results files on disk
 
     if not os.path.exists(games_dir):
         return
 
+    jobs = []
+
     for filename in os.listdir(games_dir):
-        if filename.endswith('.csv'):
+        if PitchStorage.format_of(filename) is not None:
             game_file = os.path.join(games_dir, filename)
 
             # Extract game id from filename
             match = re.search(r'Game(\d+)', filename)
             game_id = int(match.group(1)) if match else 0
 
-            df = pd.read_csv(game_file)
+            jobs.extend(usage_jobs_from_table(game_file, game_id))
 
-            for pitcher_id in df['PitcherId'].unique():
-                pitch_usage_stats = df[df['PitcherId'] == pitcher_id]
-
-                def to_int_safe(value):
-                    try:
-                        return int(value)
-                    except (TypeError, ValueError):
-                        return 0
-
-                pitch_usage_stats = {
-                    'GameId': game_id,
-                    'PitcherId': to_int_safe(pitcher_id),
-                    'TotalPitches': to_int_safe(pitch_usage_stats['TotalPitches'].iloc[0] if 'TotalPitches' in pitch_usage_stats.columns and not pitch_usage_stats['TotalPitches'].empty else 0),
-                    'FF': to_int_safe(pitch_usage_stats['FF'].iloc[0] if 'FF' in pitch_usage_stats.columns and not pitch_usage_stats['FF'].empty else 0),
-                    'SI': to_int_safe(pitch_usage_stats['SI'].iloc[0] if 'SI' in pitch_usage_stats.columns and not pitch_usage_stats['SI'].empty else 0),
-                    'FC': to_int_safe(pitch_usage_stats['FC'].iloc[0] if 'FC' in pitch_usage_stats.columns and not pitch_usage_stats['FC'].empty else 0),
-                    'CU': to_int_safe(pitch_usage_stats['CU'].iloc[0] if 'CU' in pitch_usage_stats.columns and not pitch_usage_stats['CU'].empty else 0),
-                    'CH': to_int_safe(pitch_usage_stats['CH'].iloc[0] if 'CH' in pitch_usage_stats.columns and not pitch_usage_stats['CH'].empty else 0),
-                    'SL': to_int_safe(pitch_usage_stats['SL'].iloc[0] if 'SL' in pitch_usage_stats.columns and not pitch_usage_stats['SL'].empty else 0),
-                    'KC': to_int_safe(pitch_usage_stats['KC'].iloc[0] if 'KC' in pitch_usage_stats.columns and not pitch_usage_stats['KC'].empty else 0)
-                }
-
-                create_pie_charts(pitch_usage_stats)
+    render_usage_charts(jobs, workers, manifest, batch)
 
 def main():
-    get_pitcher_data()
+    parser = argparse.ArgumentParser(description='Render pitch usage pie charts from the PitcherGameResults files')
+    parser.add_argument('--games-dir', default='PitcherGameResults')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of rendering processes (default: %(default)s)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only redraw charts whose data changed since the last run')
+    ChartRenderer.add_arguments(parser)
+    StageMetrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    ChartRenderer.set_output_from_args(parser, args)
+    StageMetrics.start_from_args(args)
+    try:
+        PitchConfig.load_config()
+    except (OSError, ValueError) as e:
+        print(f"Pitch color load failed: {e}")
+        return
+
+    manifest = BuildManifest.load_manifest() if args.incremental else None
+    get_pitcher_data(args.games_dir, args.workers, manifest, args.batch)
+    if manifest is not None:
+        BuildManifest.save_manifest(manifest)
+    StageMetrics.finish_from_args(args)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,254 @@
+import argparse
+import os
+import time
+
+import LazyImport
+import ChartRenderer
+import HitterResultsGenerator
+import PitchStorage
+import PitchValidation
+import PitcherResultsGenerator
+import SeasonAggregates
+import StageMetrics
+import PItchUsagePieCreator
+import PitchMovementChartCreator
+
+pd = LazyImport.lazy_module('pandas')
+
+# Runs the whole workflow (sort -> results -> usage/movement charts) in one
+# process. Each stage hands its DataFrames to the next in memory; only the
+# final artifacts are written to disk
+
+STAGE_DEPENDENCIES = {
+    'sort': [],
+    'results': ['sort'],
+    'hitters': ['results'],
+    'usage': ['results'],
+    'movement': ['results'],
+}
+STAGE_ORDER = ['sort', 'results', 'hitters', 'usage', 'movement']
+
+
+def stages_to_run(stop_after=None):
+    # The target stage plus everything it depends on, in execution order
+    if stop_after is None:
+        return list(STAGE_ORDER)
+
+    needed = set()
+    pending = [stop_after]
+    while pending:
+        stage = pending.pop()
+        if stage not in needed:
+            needed.add(stage)
+            pending.extend(STAGE_DEPENDENCIES[stage])
+    return [stage for stage in STAGE_ORDER if stage in needed]
+
+
+@StageMetrics.instrument
+def run_sort(state):
+    # One read of the source feed, kept as text so sorted game files are written
+    # exactly as PitchDataSorter writes them
+    raw = pd.read_csv(state['source_csv'], dtype=str, keep_default_na=False)
+    for column in ('GamePk', 'AtBatNumber', 'PitchNumber'):
+        if column not in raw.columns:
+            raise ValueError(f"Column '{column}' not found in CSV header")
+
+    rows_in = len(raw)
+    if state['validate']:
+        raw, quarantined, report = PitchValidation.validate_frame(raw)
+        state['validation'] = report
+        # Same place as PitchDataSorter --validate puts it
+        quarantine_csv = PitchValidation.quarantine_path(
+            os.path.join(state['validated_dir'], os.path.basename(state['source_csv'])))
+        if len(quarantined):
+            os.makedirs(state['validated_dir'], exist_ok=True)
+            quarantined.to_csv(quarantine_csv, index=False)
+            print(f"Quarantined {len(quarantined)} rows to '{quarantine_csv}'")
+        elif os.path.exists(quarantine_csv):
+            os.remove(quarantine_csv)
+    raw = raw[(raw['GamePk'] != '') & (raw['AtBatNumber'] != '')]
+
+    games = {}
+    for game_id, rows in raw.groupby('GamePk', sort=False):
+        keys = pd.DataFrame({'AtBatNumber': rows['AtBatNumber'].astype(int),
+                             'PitchNumber': rows['PitchNumber'].astype(int)}, index=rows.index)
+        order = keys.sort_values(['AtBatNumber', 'PitchNumber'], kind='stable').index
+        games[game_id] = rows.loc[order].reset_index(drop=True)
+
+    if state['write_sorted']:
+        os.makedirs(state['games_dir'], exist_ok=True)
+        for game_id, rows in games.items():
+            rows.to_csv(os.path.join(state['games_dir'], f"game_{game_id}.csv"), index=False, lineterminator='\r\n')
+
+    state['games'] = games
+    rows_out = sum(len(rows) for rows in games.values())
+    StageMetrics.note(rows_in=rows_in, rows_out=rows_out)
+    return rows_out
+
+
+@StageMetrics.instrument
+def results_for_game(state, game_id, rows):
+    # One game of the results stage: the unit the metrics profile
+    StageMetrics.note(game=game_id, rows_in=len(rows))
+    game_file = os.path.join(state['games_dir'], f"game_{game_id}.csv")
+    game = PitcherResultsGenerator.GameContext(game_file, game_id, PitcherResultsGenerator.game_frame_from_text(rows))
+
+    pitcher_stats = PitcherResultsGenerator.calculate_pitcher_stats(game_file, game_id, game)
+    PitcherResultsGenerator.create_pitcher_results_csv(game_file, game_id, game=game, fmt=state['format'],
+                                                       pitcher_stats=pitcher_stats)
+    PitcherResultsGenerator.calculate_pitcher_movement(game_file, game_id, game, state['format'])
+    if 'pitchers' in state['seasons']:
+        SeasonAggregates.merge_game_frame(state['seasons']['pitchers'], game_id, game.df)
+    StageMetrics.note(rows_out=len(pitcher_stats))
+    return game, pitcher_stats
+
+
+@StageMetrics.instrument_stage
+def run_results(state):
+    contexts = {}
+    stats = {}
+    for game_id, rows in state['games'].items():
+        contexts[game_id], stats[game_id] = results_for_game(state, game_id, rows)
+
+    state['contexts'] = contexts
+    state['stats'] = stats
+    pitchers = sum(len(pitcher_stats) for pitcher_stats in stats.values())
+    StageMetrics.note(rows_in=sum(len(game) for game in contexts.values()), rows_out=pitchers)
+    return pitchers
+
+
+@StageMetrics.instrument
+def hitters_for_game(state, game_id, game):
+    StageMetrics.note(game=game_id, rows_in=len(game))
+    hitter_stats = HitterResultsGenerator.calculate_hitter_stats(game.game_file, game_id, game)
+    HitterResultsGenerator.create_hitter_results_csv(game.game_file, game_id, game=game, fmt=state['format'],
+                                                     hitter_stats=hitter_stats)
+    if 'hitters' in state['seasons']:
+        SeasonAggregates.merge_game_frame(state['seasons']['hitters'], game_id, game.df)
+    StageMetrics.note(rows_out=len(hitter_stats))
+    return len(hitter_stats)
+
+
+@StageMetrics.instrument_stage
+def run_hitters(state):
+    # Reuses the parsed games from the results stage
+    batters = 0
+    for game_id, game in state['contexts'].items():
+        batters += hitters_for_game(state, game_id, game)
+    StageMetrics.note(rows_out=batters)
+    return batters
+
+
+@StageMetrics.instrument_stage
+def run_usage(state):
+    # Straight from the results stage's stats
+    jobs = []
+    for game_id, pitcher_stats in state['stats'].items():
+        jobs.extend(PItchUsagePieCreator.usage_jobs(game_id, pitcher_stats))
+
+    PItchUsagePieCreator.render_usage_charts(jobs, state['workers'], batch=state['batch'])
+    StageMetrics.note(rows_out=len(jobs))
+    return len(jobs)
+
+
+@StageMetrics.instrument_stage
+def run_movement(state):
+    jobs = []
+    for game_id, game in state['contexts'].items():
+        for pitcher_id, rows in game.pitchers():
+            # One point per PitchId, as when the chart reads the PitcherMovement file
+            rows = rows.drop_duplicates('PitchId')
+            if len(rows):
+                jobs.append(PitchMovementChartCreator.movement_job(
+                    game_id, pitcher_id, rows['PitchType'], rows['TrajectoryHorizontalBreak'],
+                    rows['TrajectoryVerticalBreakInduced']))
+
+    PitchMovementChartCreator.render_movement_charts(jobs, state['workers'], batch=state['batch'])
+    StageMetrics.note(rows_out=len(jobs))
+    return len(jobs)
+
+
+STAGE_FUNCTIONS = {
+    'sort': run_sort,
+    'results': run_results,
+    'hitters': run_hitters,
+    'usage': run_usage,
+    'movement': run_movement,
+}
+
+
+def run_pipeline(source_csv='AnalyticsQuestionnairePitchData.csv', games_dir='gamesSorted', stop_after=None,
+                 write_sorted=True, fmt='csv', workers=1, seasons=None, batch=False, validate=False,
+                 validated_dir='validated'):
+    # seasons: SeasonAggregates stores by kind that each processed game is merged into.
+    # batch: one multi-pitcher chart sheet per game instead of a file per pitcher.
+    # validate: check the feed first (PitchValidation) and drop the rows it
+    # quarantines, writing them to validated_dir
+    state = {
+        'source_csv': source_csv,
+        'games_dir': games_dir,
+        'write_sorted': write_sorted,
+        'format': fmt,
+        'workers': workers,
+        'seasons': seasons or {},
+        'batch': batch,
+        'validate': validate,
+        'validated_dir': validated_dir,
+    }
+
+    timings = []
+    for stage in stages_to_run(stop_after):
+        start = time.perf_counter()
+        items = STAGE_FUNCTIONS[stage](state)
+        timings.append((stage, time.perf_counter() - start, items))
+    return timings
+
+
+def print_timings(timings):
+    print(f"{'stage':<10} {'seconds':>9} {'items':>8}")
+    for stage, seconds, items in timings:
+        print(f"{stage:<10} {seconds:>9.3f} {items:>8}")
+    print(f"{'total':<10} {sum(seconds for _, seconds, _ in timings):>9.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the full pitch data pipeline in one process')
+    parser.add_argument('--input', default='AnalyticsQuestionnairePitchData.csv')
+    parser.add_argument('--games-dir', default='gamesSorted')
+    parser.add_argument('--stop-after', choices=STAGE_ORDER,
+                        help='run only this stage and the stages it depends on')
+    parser.add_argument('--no-sorted-files', action='store_true',
+                        help="keep the sorted games in memory instead of writing them to --games-dir")
+    parser.add_argument('--format', choices=PitchStorage.FORMATS, default='csv',
+                        help='storage format for the results and movement tables (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of chart rendering processes (default: %(default)s)')
+    parser.add_argument('--season', action='store_true',
+                        help='merge every game into the pitcher and hitter season aggregates')
+    parser.add_argument('--season-csv', action='store_true',
+                        help='with --season, also rewrite the season results CSVs (reads every player of the season)')
+    parser.add_argument('--validate', action='store_true',
+                        help='validate the feed first and leave out the rows it quarantines')
+    parser.add_argument('--validated-dir', default='validated',
+                        help='where --validate writes the quarantined rows (default: %(default)s)')
+    ChartRenderer.add_arguments(parser)
+    StageMetrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    ChartRenderer.set_output_from_args(parser, args)
+    StageMetrics.start_from_args(args)
+
+    seasons = {kind: SeasonAggregates.load_season(kind) for kind in SeasonAggregates.SEASON_KINDS} if args.season else {}
+    timings = run_pipeline(args.input, args.games_dir, args.stop_after, not args.no_sorted_files,
+                           args.format, args.workers, seasons, args.batch, args.validate,
+                           args.validated_dir)
+    print_timings(timings)
+    for season in seasons.values():
+        SeasonAggregates.save_season(season)
+        if args.season_csv:
+            SeasonAggregates.write_season_csv(season)
+    StageMetrics.finish_from_args(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,430 @@
+import argparse
+import contextlib
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import ChartRenderer
+import PitchDataSorter
+import PitcherResultsGenerator
+import PItchUsagePieCreator
+import PitchMovementChartCreator
+import SyntheticFeed
+
+# Cold-start import budgets (milliseconds, median of fresh interpreters). The
+# sorter only needs the standard library, so it must stay well under the
+# ~0.5 s that pandas alone costs
+IMPORT_BUDGETS_MS = {
+    'PitchDataSorter': 150,
+}
+
+# Modules no pipeline module may import at load time
+HEAVY_MODULES = ['pandas', 'numpy', 'matplotlib', 'scipy', 'pyarrow']
+
+
+def replicate_games(games_dir, target_dir, copies):
+    # Fill target_dir with `copies` renumbered copies of every game file so the
+    # batch is large enough for worker scaling to show
+    os.makedirs(target_dir, exist_ok=True)
+    sources = sorted(f for f in os.listdir(games_dir) if f.endswith('.csv'))
+    game_number = 0
+    for _ in range(copies):
+        for filename in sources:
+            game_number += 1
+            shutil.copyfile(os.path.join(games_dir, filename),
+                            os.path.join(target_dir, f"game_{game_number}.csv"))
+    return game_number
+
+
+def benchmark_workers(games_dir='gamesSorted', copies=50, worker_counts=None):
+    # Time process_all_games over the same replicated batch at each worker count
+    if worker_counts is None:
+        cpu_count = os.cpu_count() or 1
+        worker_counts = sorted({1, *(2 ** i for i in range(cpu_count.bit_length()) if 2 ** i <= cpu_count), cpu_count})
+
+    games_dir = os.path.abspath(games_dir)
+    results = []
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        batch_dir = os.path.join(work_dir, 'gamesSorted')
+        game_count = replicate_games(games_dir, batch_dir, copies)
+
+        # Outputs go to directories relative to the CWD, so run inside the scratch dir
+        os.chdir(work_dir)
+        try:
+            for workers in worker_counts:
+                for output_dir in ('PitcherGameResults', 'PitcherMovement'):
+                    shutil.rmtree(output_dir, ignore_errors=True)
+
+                start = time.perf_counter()
+                PitcherResultsGenerator.process_all_games(batch_dir, workers)
+                elapsed = time.perf_counter() - start
+
+                results.append({'workers': workers, 'games': game_count, 'seconds': round(elapsed, 4)})
+        finally:
+            os.chdir(original_cwd)
+
+    baseline = results[0]['seconds']
+    for result in results:
+        result['speedup'] = round(baseline / result['seconds'], 2) if result['seconds'] > 0 else 0
+        result['efficiency'] = round(result['speedup'] / result['workers'], 2)
+    return results
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _profile_child(conn, fn, args):
+    start_rss = peak_rss_mb()
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        items = fn(*args)
+    conn.send({
+        'seconds': time.perf_counter() - start_wall,
+        'cpu_seconds': time.process_time() - start_cpu,
+        'items': items,
+        'peak_rss_mb': peak_rss_mb(),
+        'rss_growth_mb': peak_rss_mb() - start_rss,
+    })
+    conn.close()
+
+
+def profile_stage(fn, *args):
+    # Run fn(*args) in a fresh child process so its peak RSS is its own and
+    # earlier stages cannot warm caches for it. fn returns an item count
+    context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else 'spawn')
+    parent_conn, child_conn = context.Pipe(duplex=False)
+    process = context.Process(target=_profile_child, args=(child_conn, fn, args))
+    process.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = None
+    process.join()
+    if result is None:
+        raise RuntimeError(f"{fn.__name__} failed in the benchmark child (exit code {process.exitcode})")
+    return result
+
+
+def game_files(games_dir):
+    return [(os.path.join(games_dir, f), f.replace('game_', '').replace('.csv', ''))
+            for f in sorted(os.listdir(games_dir)) if f.endswith('.csv')]
+
+
+def stage_split(source_csv, games_dir):
+    return PitchDataSorter.split_csv_by_gamepk(source_csv, games_dir)
+
+
+def stage_sort(games_dir):
+    files = game_files(games_dir)
+    for game_file, _ in files:
+        PitchDataSorter.sort_pitch_data(game_file)
+    return len(files)
+
+
+def stage_pitcher_stats(games_dir):
+    pitchers = 0
+    for game_file, game_id in game_files(games_dir):
+        pitchers += len(PitcherResultsGenerator.calculate_pitcher_stats(game_file, game_id))
+    return pitchers
+
+
+def stage_pitcher_movement(games_dir):
+    files = game_files(games_dir)
+    for game_file, game_id in files:
+        PitcherResultsGenerator.calculate_pitcher_movement(game_file, game_id)
+    return len(os.listdir('PitcherMovement'))
+
+
+def stage_usage_charts(results_dir):
+    PItchUsagePieCreator.get_pitcher_data(results_dir)
+    return len(os.listdir('PitchUsageCharts'))
+
+
+def stage_movement_charts(movement_dir):
+    PitchMovementChartCreator.get_pitcher_data(movement_dir)
+    return len(os.listdir('PitchMovementCharts'))
+
+
+def copy_sample(source_dir, target_dir, limit):
+    # The chart stages get a fixed-size sample so large feeds stay affordable
+    os.makedirs(target_dir, exist_ok=True)
+    for filename in sorted(os.listdir(source_dir))[:limit]:
+        shutil.copyfile(os.path.join(source_dir, filename), os.path.join(target_dir, filename))
+
+
+def benchmark_stages(n_pitches, n_games=None, n_pitchers=None, chart_limit=50, seed=0):
+    # Generate a synthetic feed and time/memory-profile each stage on it
+    results = []
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            rows = SyntheticFeed.generate_synthetic_feed('feed.csv', n_pitches, n_games, n_pitchers, seed=seed)
+
+            def run(stage, unit, fn, *args):
+                result = profile_stage(fn, *args)
+                result.update({'stage': stage, 'pitches': rows, 'unit': unit})
+                result['items_per_second'] = result['items'] / result['seconds'] if result['seconds'] > 0 else 0
+                result['pitches_per_second'] = rows / result['seconds'] if result['seconds'] > 0 else 0
+                results.append(result)
+
+            run('split_csv_by_gamepk', 'games', stage_split, 'feed.csv', 'gamesSorted')
+            run('sort_pitch_data', 'games', stage_sort, 'gamesSorted')
+            run('calculate_pitcher_stats', 'pitchers', stage_pitcher_stats, 'gamesSorted')
+            run('calculate_pitcher_movement', 'files', stage_pitcher_movement, 'gamesSorted')
+
+            # Results files for the usage charts (not timed)
+            for game_file, game_id in game_files('gamesSorted'):
+                PitcherResultsGenerator.create_pitcher_results_csv(game_file, game_id)
+
+            # Roughly eight pitchers per results file
+            copy_sample('PitcherGameResults', 'sample_results', max(1, chart_limit // 8))
+            copy_sample('PitcherMovement', 'sample_movement', chart_limit)
+            run('create_pie_charts', 'charts', stage_usage_charts, 'sample_results')
+            run('create_movement_charts', 'charts', stage_movement_charts, 'sample_movement')
+            for result in results[-2:]:
+                # Throughput for chart stages is only meaningful per chart
+                result['pitches'] = None
+                result['pitches_per_second'] = None
+        finally:
+            os.chdir(original_cwd)
+
+    for result in results:
+        for key in ('seconds', 'cpu_seconds', 'peak_rss_mb', 'rss_growth_mb', 'items_per_second', 'pitches_per_second'):
+            if result[key] is not None:
+                result[key] = round(result[key], 4)
+    return results
+
+
+# Chart output modes compared by benchmark_charts: (batch, format, dpi, tight
+# bbox). 'files' is the default one-PNG-per-pitcher output
+CHART_MODES = {
+    'files': (False, 'png', ChartRenderer.DEFAULT_DPI, True),
+    'files-thumbnail': (False, 'png', ChartRenderer.THUMBNAIL_DPI, False),
+    'files-svg': (False, 'svg', ChartRenderer.DEFAULT_DPI, True),
+    'sheets': (True, 'png', ChartRenderer.DEFAULT_DPI, True),
+    'sheets-thumbnail': (True, 'png', ChartRenderer.THUMBNAIL_DPI, False),
+    'sheets-svg': (True, 'svg', ChartRenderer.DEFAULT_DPI, True),
+    'sheets-pdf': (True, 'pdf', ChartRenderer.DEFAULT_DPI, True),
+}
+
+CHART_DIRS = ['PitchUsageCharts', 'PitchMovementCharts']
+
+
+def stage_charts(results_dir, movement_dir, mode):
+    # Usage and movement charts of every pitcher in one output mode. Returns
+    # the number of pitcher charts (panels, for sheets) drawn
+    batch, fmt, dpi, tight = CHART_MODES[mode]
+    ChartRenderer.set_output_options(fmt, dpi, tight)
+    PItchUsagePieCreator.get_pitcher_data(results_dir, batch=batch)
+    PitchMovementChartCreator.get_pitcher_data(movement_dir, batch=batch)
+    return sum(len(PItchUsagePieCreator.usage_jobs_from_table(os.path.join(results_dir, f), 0))
+               for f in os.listdir(results_dir)) + len(os.listdir(movement_dir))
+
+
+def directory_bytes(directories):
+    files = [os.path.join(d, f) for d in directories if os.path.exists(d) for f in os.listdir(d)]
+    return len(files), sum(os.path.getsize(f) for f in files)
+
+
+def benchmark_charts(n_pitches, n_games=None, n_pitchers=None, modes=None, seed=0):
+    # Render the same synthetic games' charts in each output mode, each in a
+    # fresh child process, and compare charts/s and bytes written
+    modes = modes or list(CHART_MODES)
+    results = []
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as work_dir:
+        os.chdir(work_dir)
+        try:
+            SyntheticFeed.generate_synthetic_feed('feed.csv', n_pitches, n_games, n_pitchers, seed=seed)
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                PitchDataSorter.split_csv_by_gamepk('feed.csv', 'gamesSorted')
+                PitcherResultsGenerator.process_all_games('gamesSorted')
+            # Import matplotlib here so no mode pays for it
+            ChartRenderer.pyplot()
+
+            for mode in modes:
+                for directory in CHART_DIRS:
+                    shutil.rmtree(directory, ignore_errors=True)
+                result = profile_stage(stage_charts, 'PitcherGameResults', 'PitcherMovement', mode)
+                files, written = directory_bytes(CHART_DIRS)
+                result.update({'mode': mode, 'charts': result.pop('items'), 'files': files, 'bytes': written})
+                result['charts_per_second'] = result['charts'] / result['seconds'] if result['seconds'] > 0 else 0
+                results.append(result)
+        finally:
+            os.chdir(original_cwd)
+
+    for result in results:
+        for key in ('seconds', 'cpu_seconds', 'peak_rss_mb', 'rss_growth_mb', 'charts_per_second'):
+            result[key] = round(result[key], 4)
+    return results
+
+
+def print_chart_table(results):
+    print(f"{'mode':<18} {'charts':>7} {'files':>6} {'seconds':>9} {'charts/s':>9} {'MB written':>11} {'KB/chart':>9}")
+    for r in results:
+        print(f"{r['mode']:<18} {r['charts']:>7} {r['files']:>6} {r['seconds']:>9.3f} {r['charts_per_second']:>9.1f} "
+              f"{r['bytes'] / 1e6:>11.2f} {r['bytes'] / 1e3 / max(r['charts'], 1):>9.1f}")
+
+
+def environment_info():
+    import numpy
+    import pandas
+    import matplotlib
+    return {
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': numpy.__version__,
+        'pandas': pandas.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+
+def print_stage_table(results):
+    print(f"{'pitches':>10} {'stage':<28} {'seconds':>9} {'cpu':>9} {'peak MB':>9} {'items':>8} {'items/s':>10}")
+    for r in results:
+        print(f"{r['size']:>10} {r['stage']:<28} {r['seconds']:>9.3f} {r['cpu_seconds']:>9.3f} "
+              f"{r['peak_rss_mb']:>9.1f} {r['items']:>8} {r['items_per_second']:>10.1f}")
+
+
+def import_time_ms(module):
+    # Cumulative import time of `module` in a fresh interpreter, from -X importtime
+    # (which reports microseconds per imported module on stderr), plus the heavy
+    # modules it pulled in
+    check = f"import sys, {module}; print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    completed = subprocess.run([sys.executable, '-X', 'importtime', '-c', check],
+                               capture_output=True, text=True, check=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    for line in completed.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+        if len(fields) == 3 and fields[2] == module:
+            heavy = [m for m in completed.stdout.strip().split(',') if m]
+            return int(fields[1]) / 1000, heavy
+    raise RuntimeError(f"No import time reported for {module}")
+
+
+def benchmark_imports(modules=None, repeat=5):
+    if modules is None:
+        modules = ['PitchDataSorter', 'PitcherResultsGenerator', 'PItchUsagePieCreator',
+                   'PitchMovementChartCreator', 'Pipeline']
+    results = []
+    for module in modules:
+        samples = []
+        for _ in range(repeat):
+            milliseconds, heavy = import_time_ms(module)
+            samples.append(milliseconds)
+        median = statistics.median(samples)
+        budget = IMPORT_BUDGETS_MS.get(module)
+        results.append({
+            'module': module,
+            'median_ms': round(median, 1),
+            'min_ms': round(min(samples), 1),
+            'budget_ms': budget,
+            'heavy_imports': heavy,
+            'ok': not heavy and (budget is None or median <= budget),
+        })
+    return results
+
+
+def print_import_table(results):
+    print(f"{'module':<28} {'median ms':>10} {'min ms':>8} {'budget':>8}  heavy imports")
+    for r in results:
+        budget = '-' if r['budget_ms'] is None else r['budget_ms']
+        status = '' if r['ok'] else '  FAIL'
+        print(f"{r['module']:<28} {r['median_ms']:>10.1f} {r['min_ms']:>8.1f} {budget:>8}  "
+              f"{', '.join(r['heavy_imports']) or '-'}{status}")
+
+
+def print_table(results):
+    print(f"{'workers':>8} {'games':>6} {'seconds':>9} {'speedup':>8} {'efficiency':>10}")
+    for r in results:
+        print(f"{r['workers']:>8} {r['games']:>6} {r['seconds']:>9.3f} {r['speedup']:>8.2f} {r['efficiency']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the pitch data pipeline')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    workers_parser = subparsers.add_parser('workers', help='process_all_games speedup per worker count')
+    workers_parser.add_argument('--games-dir', default='gamesSorted')
+    workers_parser.add_argument('--copies', type=int, default=50,
+                                help='copies of each game file in the benchmark batch (default: %(default)s)')
+    workers_parser.add_argument('--workers', type=int, nargs='+',
+                                help='worker counts to time (default: powers of two up to the core count)')
+    workers_parser.add_argument('--json', help='also write the results to this JSON file')
+
+    stages_parser = subparsers.add_parser('stages', help='time and memory of every stage on synthetic feeds')
+    stages_parser.add_argument('--sizes', nargs='+', default=['10k'],
+                               help='feed sizes in pitches, e.g. 10k 1M 10M (default: %(default)s)')
+    stages_parser.add_argument('--games', type=int, help='games per feed (default: one per 300 pitches)')
+    stages_parser.add_argument('--pitchers', type=int, help='pitcher pool size (default: scales with games)')
+    stages_parser.add_argument('--chart-limit', type=int, default=50,
+                               help='charts rendered per chart stage (default: %(default)s)')
+    stages_parser.add_argument('--seed', type=int, default=0)
+    stages_parser.add_argument('--json', help='also write the results to this JSON file')
+
+    charts_parser = subparsers.add_parser('charts', help='chart rendering speed and output size per output mode')
+    charts_parser.add_argument('--size', default='5k', help='synthetic feed size in pitches (default: %(default)s)')
+    charts_parser.add_argument('--games', type=int, help='games in the feed (default: one per 300 pitches)')
+    charts_parser.add_argument('--pitchers', type=int, help='pitcher pool size (default: scales with games)')
+    charts_parser.add_argument('--modes', nargs='+', choices=list(CHART_MODES),
+                               help='output modes to compare (default: all)')
+    charts_parser.add_argument('--seed', type=int, default=0)
+    charts_parser.add_argument('--json', help='also write the results to this JSON file')
+
+    imports_parser = subparsers.add_parser('imports', help='cold-start import time per module, checked against budgets')
+    imports_parser.add_argument('--modules', nargs='+', help='modules to time (default: the pipeline scripts)')
+    imports_parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module (default: %(default)s)')
+    imports_parser.add_argument('--json', help='also write the results to this JSON file')
+    args = parser.parse_args()
+
+    if args.command == 'workers':
+        results = benchmark_workers(args.games_dir, args.copies, args.workers)
+        print_table(results)
+        report = results
+    elif args.command == 'charts':
+        results = benchmark_charts(SyntheticFeed.parse_count(args.size), args.games, args.pitchers, args.modes,
+                                   args.seed)
+        print_chart_table(results)
+        report = {'environment': environment_info(), 'results': results}
+    elif args.command == 'imports':
+        results = benchmark_imports(args.modules, args.repeat)
+        print_import_table(results)
+        report = results
+    else:
+        results = []
+        for size in args.sizes:
+            for result in benchmark_stages(SyntheticFeed.parse_count(size), args.games, args.pitchers,
+                                           args.chart_limit, args.seed):
+                result['size'] = size
+                results.append(result)
+        print_stage_table(results)
+        report = {'environment': environment_info(), 'results': results}
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.command == 'imports' and not all(r['ok'] for r in results):
+        sys.exit("Import time budget exceeded or a heavy dependency is imported at load time")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,368 @@
+import argparse
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import LazyImport
+import PitchStorage
+import StageMetrics
+from PItchUsagePieCreator import PITCH_KEYS
+from PitcherResultsGenerator import counted_pitches
+
+np = LazyImport.lazy_module('numpy')
+pd = LazyImport.lazy_module('pandas')
+
+# Per-pitcher pitch type check: each pitcher's pitches are clustered with
+# k-means on release speed, movement and spin, seeded with one cluster per
+# pitch type the feed gives them, and every pitch is re-labelled with the type
+# of its nearest cluster. Mislabelled pitches move to the type they look like,
+# and pitches of types too rare to stand alone (or with no type) join one.
+#
+# A pitcher's model is kept in model_dir as additive per-cluster sums and
+# counts, with each game's contribution, like the season aggregates. A new or
+# changed game only adds (or replaces) its own contribution: its pitches are
+# assigned to the current centroids and the centroids move to the new means.
+# Games merged earlier keep their labels until the model is refit
+MODEL_VERSION = 1
+
+MODEL_DIR = 'PitchClusters'
+MOVEMENT_OUTPUT_DIR = 'ReclassifiedMovement'
+RESULTS_OUTPUT_DIR = 'ReclassifiedResults'
+
+# Movement file columns the clustering reads. The spin axis is an angle, so it
+# enters as its cosine and sine; spin rate is in rpm, breaks in feet
+FEATURE_COLUMNS = ['ReleaseSpeed', 'TrajectoryHorizontalBreak', 'TrajectoryVerticalBreakInduced',
+                   'ReleaseSpinRate', 'ReleaseSpinAxis']
+FEATURES = ['ReleaseSpeed', 'TrajectoryHorizontalBreak', 'TrajectoryVerticalBreakInduced',
+            'ReleaseSpinRate', 'SpinAxisCos', 'SpinAxisSin']
+
+# A feed pitch type needs this many of the pitcher's pitches for a cluster
+MIN_CLUSTER_PITCHES = 5
+
+MAX_ITERATIONS = 50
+
+MOVEMENT_FILE = re.compile(r'Pitcher(\d+)MetricsGame(\d+)')
+
+
+def model_path(pitcher_id, model_dir=MODEL_DIR):
+    return os.path.join(model_dir, f"Pitcher{pitcher_id}Model.json")
+
+
+def feature_matrix(df):
+    # (n, len(FEATURES)) float array; rows with any missing input are NaN
+    values = {column: pd.to_numeric(df[column], errors='coerce').to_numpy(dtype=float) if column in df.columns
+              else np.full(len(df), np.nan) for column in FEATURE_COLUMNS}
+    axis = np.radians(values['ReleaseSpinAxis'])
+    return np.column_stack([values['ReleaseSpeed'], values['TrajectoryHorizontalBreak'],
+                            values['TrajectoryVerticalBreakInduced'], values['ReleaseSpinRate'],
+                            np.cos(axis), np.sin(axis)])
+
+
+def nearest(X, centroids):
+    # Index of the closest centroid for every row, from |x - c|^2 without the
+    # constant |x|^2 term, so no (n, k, features) array is built
+    distances = (centroids * centroids).sum(axis=1) - 2 * X @ centroids.T
+    return distances.argmin(axis=1)
+
+
+def cluster_sums(X, labels, k):
+    # Per-cluster feature sums and pitch counts
+    sums = np.zeros((k, X.shape[1]))
+    for feature in range(X.shape[1]):
+        sums[:, feature] = np.bincount(labels, weights=X[:, feature], minlength=k)
+    return sums, np.bincount(labels, minlength=k)
+
+
+def kmeans(X, centroids, max_iterations=MAX_ITERATIONS):
+    # Lloyd's algorithm from the given centroids. A cluster that loses all its
+    # pitches keeps its centroid. Returns (centroids, labels)
+    labels = nearest(X, centroids)
+    for _ in range(max_iterations):
+        sums, counts = cluster_sums(X, labels, len(centroids))
+        centroids = np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], centroids)
+        new_labels = nearest(X, centroids)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+    return centroids, labels
+
+
+def seed_types(feed_types, min_pitches=MIN_CLUSTER_PITCHES, known=()):
+    # Feed pitch types that get a cluster, most used first, after the types in
+    # known (which already have one)
+    counts = pd.Series(feed_types, dtype=object).dropna().value_counts()
+    return list(known) + [t for t, n in counts.items() if n >= min_pitches and t not in known]
+
+
+def fit_model(pitcher_id, X, feed_types):
+    # A new model from the pitches of every game at once. Features are scaled by
+    # this data's mean and spread, fixed for the model's lifetime
+    center = X.mean(axis=0)
+    scale = X.std(axis=0)
+    scale[~(scale > 0)] = 1.0
+    Z = (X - center) / scale
+
+    # A pitcher with too few pitches of every type keeps all of their types
+    types = seed_types(feed_types) or seed_types(feed_types, min_pitches=1)
+    if not types:
+        types = ['UN']
+        seeds = Z.mean(axis=0, keepdims=True)
+    else:
+        seeds = np.array([Z[feed_types == t].mean(axis=0) for t in types])
+    centroids, _ = kmeans(Z, seeds)
+    return {
+        'version': MODEL_VERSION,
+        'pitcher': int(pitcher_id),
+        'features': FEATURES,
+        'center': center.tolist(),
+        'scale': scale.tolist(),
+        'types': types,
+        'seeds': centroids.tolist(),
+        'sums': np.zeros_like(centroids).tolist(),
+        'counts': [0] * len(types),
+        'games': {},
+    }
+
+
+def centroids(model):
+    # Mean of each cluster's pitches; the fitted seed while it has none
+    sums = np.asarray(model['sums'], dtype=float)
+    counts = np.asarray(model['counts'], dtype=float)
+    return np.where(counts[:, None] > 0, sums / np.maximum(counts, 1)[:, None], np.asarray(model['seeds']))
+
+
+def standardize(model, X):
+    return (X - np.asarray(model['center'])) / np.asarray(model['scale'])
+
+
+def remove_game(model, game_id):
+    entry = model['games'].pop(str(game_id), None)
+    if entry is None:
+        return
+    for cluster, (sums, count) in enumerate(zip(entry['sums'], entry['counts'])):
+        model['sums'][cluster] = (np.asarray(model['sums'][cluster]) - sums).tolist()
+        model['counts'][cluster] -= count
+
+
+def add_cluster(model, pitch_type, seed):
+    model['types'].append(pitch_type)
+    model['seeds'].append(seed.tolist())
+    model['sums'].append([0.0] * len(FEATURES))
+    model['counts'].append(0)
+    for entry in model['games'].values():
+        entry['sums'].append([0.0] * len(FEATURES))
+        entry['counts'].append(0)
+
+
+def merge_game(model, game_id, X, feed_types, source=None, fixed_centroids=None):
+    # Add (or replace) one game's pitches; rows with missing features are left
+    # out. A feed type new to the pitcher with enough pitches in this game gets
+    # its own cluster. Pitches go to the nearest current cluster mean, or to
+    # fixed_centroids when given (a fresh fit's k-means centroids). Returns the
+    # reclassified type of every row (the feed type where a row could not be
+    # classified)
+    remove_game(model, game_id)
+    valid = ~np.isnan(X).any(axis=1)
+    Z = standardize(model, X[valid])
+    for pitch_type in seed_types(feed_types[valid], known=model['types'])[len(model['types']):]:
+        add_cluster(model, pitch_type, Z[feed_types[valid] == pitch_type].mean(axis=0))
+
+    if fixed_centroids is None:
+        fixed_centroids = centroids(model)
+    labels = nearest(Z, fixed_centroids) if len(Z) else np.empty(0, dtype=int)
+    sums, counts = cluster_sums(Z, labels, len(model['types']))
+    model['sums'] = (np.asarray(model['sums']) + sums).tolist()
+    model['counts'] = (np.asarray(model['counts']) + counts).tolist()
+    model['games'][str(game_id)] = {'source': source, 'sums': sums.tolist(), 'counts': counts.tolist()}
+
+    types = np.array(feed_types, dtype=object)
+    types[valid] = np.array(model['types'], dtype=object)[labels]
+    return types
+
+
+def load_model(path):
+    try:
+        with open(path, 'r') as f:
+            model = json.load(f)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable pitch type model {path}: {e}")
+        return None
+    if model.get('version') != MODEL_VERSION or model.get('features') != FEATURES:
+        return None
+    return model
+
+
+def save_model(model, path):
+    # Same atomic write as the season aggregates
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(model, f)
+    os.replace(tmp_path, path)
+
+
+def _source_state(path):
+    stat = os.stat(path)
+    return {'file': os.path.abspath(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def read_movement(path):
+    # One point per PitchID, as the movement chart draws them
+    df = PitchStorage.read_table(path)
+    if 'PitchID' in df.columns:
+        df = df.drop_duplicates('PitchID')
+    return df.reset_index(drop=True)
+
+
+def write_reclassified(df, types, game_id, pitcher_id, output_dir, fmt):
+    # The movement table with PitchType replaced, the feed's kept as FeedPitchType
+    df = df.copy()
+    df['FeedPitchType'] = df['PitchType']
+    df['PitchType'] = types
+    os.makedirs(output_dir, exist_ok=True)
+    return PitchStorage.write_table(df, os.path.join(output_dir, f"Pitcher{pitcher_id}MetricsGame{game_id}"), fmt)
+
+
+@StageMetrics.instrument
+def classify_pitcher(pitcher_id, game_files, model_dir=MODEL_DIR, output_dir=MOVEMENT_OUTPUT_DIR, refit=False):
+    # Bring one pitcher's model up to date with their movement files
+    # ({game_id: path}) and write the reclassified files of the games merged.
+    # Returns {game_id: changed pitch count} for those games
+    path = model_path(pitcher_id, model_dir)
+    model = None if refit else load_model(path)
+    if model is None:
+        pending = dict(game_files)
+    else:
+        pending = {game_id: game_file for game_id, game_file in game_files.items()
+                   if (model['games'].get(str(game_id)) or {}).get('source') != _source_state(game_file)}
+    if not pending:
+        return {}
+
+    games = {game_id: read_movement(game_file) for game_id, game_file in pending.items()}
+    StageMetrics.note(pitcher=pitcher_id, games=len(games), rows_in=sum(len(df) for df in games.values()))
+    if model is None:
+        frames = [df for df in games.values() if len(df)]
+        if not frames:
+            return {}
+        X = np.concatenate([feature_matrix(df) for df in frames])
+        feed_types = np.concatenate([df['PitchType'].to_numpy(dtype=object) for df in frames])
+        valid = ~np.isnan(X).any(axis=1)
+        if not valid.any():
+            return {}
+        model = fit_model(pitcher_id, X[valid], feed_types[valid])
+        fitted = np.asarray(model['seeds'])
+    else:
+        fitted = None
+
+    changed = {}
+    for game_id, df in games.items():
+        feed_types = pd.Series(df['PitchType'], dtype=object)
+        types = pd.Series(merge_game(model, game_id, feature_matrix(df), feed_types.to_numpy(),
+                                     _source_state(pending[game_id]), fitted), dtype=object)
+        write_reclassified(df, types.to_numpy(), game_id, pitcher_id, output_dir,
+                           PitchStorage.format_of(pending[game_id]) or 'csv')
+        changed[game_id] = int(((types != feed_types) & ~(types.isna() & feed_types.isna())).sum())
+
+    save_model(model, path)
+    return changed
+
+
+def _classify_task(task):
+    return task[0], classify_pitcher(*task)
+
+
+def movement_files_by_pitcher(movement_dir):
+    # {pitcher_id: {game_id: path}} of the movement tables in movement_dir
+    pitchers = {}
+    for filename in PitchStorage.list_tables(movement_dir):
+        match = MOVEMENT_FILE.search(filename)
+        if match:
+            pitchers.setdefault(int(match.group(1)), {})[int(match.group(2))] = os.path.join(movement_dir, filename)
+    return pitchers
+
+
+def write_usage_tables(game_ids, movement_dir=MOVEMENT_OUTPUT_DIR, output_dir=RESULTS_OUTPUT_DIR):
+    # Per-game pitch type counts from the reclassified movement files, as
+    # PitcherResultsGame tables the usage pie charts read. Pitches are counted
+    # as calculate_pitcher_stats counts them: rows repeating the previous
+    # PitchNumber (pickoffs, stolen bases) are not pitches
+    files = {}
+    for pitcher_id, games in movement_files_by_pitcher(movement_dir).items():
+        for game_id, path in games.items():
+            if game_id in game_ids:
+                files.setdefault(game_id, []).append((pitcher_id, path))
+
+    os.makedirs(output_dir, exist_ok=True)
+    for game_id, pitchers in files.items():
+        rows = []
+        for pitcher_id, path in sorted(pitchers):
+            df = PitchStorage.read_table(path)
+            types = df['PitchType']
+            if 'PitchNumber' in df.columns:
+                # Movement files written before PitchNumber was kept count every row
+                types = types[counted_pitches(df, [pd.Series(pitcher_id, index=df.index)])]
+            row = {'PitcherId': pitcher_id, 'TotalPitches': len(types)}
+            row.update({pitch_type: int((types == pitch_type).sum()) for pitch_type in PITCH_KEYS})
+            rows.append(row)
+        pd.DataFrame(rows, columns=['PitcherId', 'TotalPitches'] + PITCH_KEYS).to_csv(
+            os.path.join(output_dir, f"PitcherResultsGame{game_id}.csv"), index=False)
+    return len(files)
+
+
+def classify_all(movement_dir='PitcherMovement', model_dir=MODEL_DIR, output_dir=MOVEMENT_OUTPUT_DIR,
+                 results_dir=RESULTS_OUTPUT_DIR, workers=1, refit=False):
+    # Update every pitcher's model, one pitcher per task across `workers`
+    # processes. Returns {pitcher_id: {game_id: changed pitch count}}
+    tasks = [(pitcher_id, games, model_dir, output_dir, refit)
+             for pitcher_id, games in sorted(movement_files_by_pitcher(movement_dir).items())]
+    if workers <= 1 or len(tasks) <= 1:
+        results = dict(_classify_task(task) for task in tasks)
+    else:
+        chunksize = max(1, len(tasks) // (workers * 4))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = dict(pool.map(_classify_task, tasks, chunksize=chunksize))
+
+    game_ids = {game_id for changed in results.values() for game_id in changed}
+    write_usage_tables(game_ids, output_dir, results_dir)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Re-label pitch types per pitcher by clustering speed, movement and spin. Draw the results with '
+                    f'PitchMovementChartCreator.py --games-dir {MOVEMENT_OUTPUT_DIR} and '
+                    f'PItchUsagePieCreator.py --games-dir {RESULTS_OUTPUT_DIR}')
+    parser.add_argument('--games-dir', default='PitcherMovement', help='PitcherMovement tables to classify')
+    parser.add_argument('--model-dir', default=MODEL_DIR)
+    parser.add_argument('--output-dir', default=MOVEMENT_OUTPUT_DIR)
+    parser.add_argument('--results-dir', default=RESULTS_OUTPUT_DIR)
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of processes, one pitcher per task (default: %(default)s)')
+    parser.add_argument('--refit', action='store_true',
+                        help='fit every model again from all games instead of merging new games into it')
+    StageMetrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.games_dir):
+        print(f"Directory {args.games_dir} does not exist")
+        return
+
+    StageMetrics.start_from_args(args)
+    start = time.perf_counter()
+    results = classify_all(args.games_dir, args.model_dir, args.output_dir, args.results_dir, args.workers,
+                           args.refit)
+    elapsed = time.perf_counter() - start
+
+    games = sum(len(changed) for changed in results.values())
+    changed = sum(sum(changed.values()) for changed in results.values())
+    print(f"Classified {games} pitcher games of {len(results)} pitchers in {elapsed:.3f} s; "
+          f"{changed} pitches changed type")
+    StageMetrics.finish_from_args(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+import argparse
+import json
+import os
+import re
+
+# Chart configuration shared by every chart stage: the pitch type -> color map
+# in PitchColors.json (next to this module, whatever the working directory),
+# loaded and validated once per process. Later calls only stat the file and
+# reload it when its mtime or size changes. Pool workers load it in their
+# initializer (see ChartRenderer.render_jobs), so rendering never reads it
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'PitchColors.json')
+
+# Color for pitch types the config does not list
+DEFAULT_COLOR = '#999999'
+
+HEX_COLOR = re.compile(r'#(?:[0-9a-fA-F]{3}|[0-9a-fA-F]{4}|[0-9a-fA-F]{6}|[0-9a-fA-F]{8})')
+
+# path -> (mtime_ns, size, PitchConfig)
+_cache = {}
+
+
+class PitchConfig:
+    # One validated PitchColors.json. Matplotlib objects (RGBA arrays, legend
+    # handles) are built on first use and then reused by every chart
+
+    def __init__(self, colors, path=CONFIG_PATH):
+        self.path = path
+        self.colors = dict(colors)
+        # The config's pitch types, in file order
+        self.pitch_types = list(colors)
+        self._rgba = {}
+        self._handles = {}
+
+    def color(self, pitch_type):
+        return self.colors.get(pitch_type, DEFAULT_COLOR)
+
+    def rgba(self, pitch_type):
+        # (r, g, b, a) floats of a pitch type's color
+        key = str(pitch_type)
+        if key not in self._rgba:
+            from matplotlib.colors import to_rgba
+            self._rgba[key] = to_rgba(self.color(pitch_type))
+        return self._rgba[key]
+
+    def rgba_array(self, pitch_types):
+        # N x 4 array of colors, one row per entry of pitch_types, for
+        # coloring a whole collection in one call
+        import numpy as np
+        return np.array([self.rgba(pitch_type) for pitch_type in pitch_types], dtype=float).reshape(-1, 4)
+
+    def legend_handles(self, pitch_types, style='movement'):
+        # Legend entries matching the movement chart's scatter points, built
+        # once per pitch type and reused across charts
+        handles = []
+        for pitch_type in pitch_types:
+            key = (style, str(pitch_type))
+            if key not in self._handles:
+                self._handles[key] = self._build_handle(pitch_type, style)
+            handles.append(self._handles[key])
+        return handles
+
+    def _build_handle(self, pitch_type, style):
+        from matplotlib.collections import PathCollection
+        from matplotlib.markers import MarkerStyle
+        from matplotlib.transforms import IdentityTransform
+        if style != 'movement':
+            raise ValueError(f"Unknown legend style '{style}'")
+        # The collection ax.scatter([], [], s=100, ...) would build, so the
+        # legend draws it like the chart's points. Opaque: the points' alpha
+        # is for overlapping pitches, not the legend
+        marker = MarkerStyle('o')
+        handle = PathCollection([marker.get_path().transformed(marker.get_transform())], sizes=[100],
+                                facecolors=[self.rgba(pitch_type)], edgecolors='black', linewidths=0.5,
+                                label=str(pitch_type))
+        # Sizes are in points, as scatter sets it; the legend would otherwise
+        # apply its own transform to the marker
+        handle.set_transform(IdentityTransform())
+        return handle
+
+
+def validate_colors(colors, path=CONFIG_PATH):
+    # The parsed config must map pitch type codes to colors matplotlib accepts
+    if not isinstance(colors, dict) or not colors:
+        raise ValueError(f"{path}: expected a non-empty JSON object of pitch type -> color")
+    problems = []
+    for pitch_type, color in colors.items():
+        if not pitch_type.strip():
+            problems.append('empty pitch type')
+        elif not isinstance(color, str):
+            problems.append(f"{pitch_type}: color must be a string, not {type(color).__name__}")
+        elif not HEX_COLOR.fullmatch(color) and not _named_color(color):
+            problems.append(f"{pitch_type}: '{color}' is not a color")
+    if problems:
+        raise ValueError(f"{path}: " + '; '.join(problems))
+
+
+def _named_color(color):
+    # Non-hex colors ('red', 'tab:blue', ...) are checked by matplotlib itself
+    from matplotlib.colors import is_color_like
+    return is_color_like(color)
+
+
+def load_config(path=CONFIG_PATH):
+    # The validated config at path, parsed again only when the file changed.
+    # Raises OSError or ValueError when it is missing or invalid
+    stat = os.stat(path)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size:
+        return cached[2]
+
+    with open(path, 'r') as f:
+        try:
+            colors = json.load(f)
+        except ValueError as e:
+            raise ValueError(f"{path}: invalid JSON: {e}") from None
+    validate_colors(colors, path)
+
+    config = PitchConfig(colors, path)
+    _cache[path] = (stat.st_mtime_ns, stat.st_size, config)
+    return config
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate the pitch color config')
+    parser.add_argument('--config', default=CONFIG_PATH)
+    args = parser.parse_args()
+
+    try:
+        config = load_config(args.config)
+    except (OSError, ValueError) as e:
+        print(f"Pitch color config failed to load: {e}")
+        raise SystemExit(1)
+    for pitch_type in config.pitch_types:
+        print(f"{pitch_type:<4} {config.color(pitch_type)}")
+
+
+if __name__ == "__main__":
+    main()
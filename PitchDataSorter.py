@@ -1,11 +1,23 @@
+import argparse
 import csv
+import heapq
 import os
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
-import scipy.stats as stats
+import tempfile
+import BuildManifest
+import StageMetrics
 
+# Approximate per-object overhead of a parsed csv row held in memory
+# (list header plus one str object and list slot per field)
+ROW_OVERHEAD_BYTES = 56
+FIELD_OVERHEAD_BYTES = 57
 
+DEFAULT_MEMORY_BUDGET = 256 * 1024 * 1024
+
+# Maximum number of sorted runs merged at once before an intermediate pass
+MAX_MERGE_FANIN = 64
+
+
+@StageMetrics.instrument
 def split_csv_by_gamepk(source_csv, output_dir):
     # Creates per-GamePk CSV files with header preserved
     if not os.path.isdir(output_dir):
@@ -41,6 +53,8 @@ def split_csv_by_gamepk(source_csv, output_dir):
                 continue
             game_to_rows.setdefault(game_id, []).append(row)
 
+    StageMetrics.note(rows_in=sum(len(rows) for rows in game_to_rows.values()))
+
     # Write the per-GamePk CSV files
     files_written = 0
     for game_id, rows in game_to_rows.items():
@@ -50,8 +64,10 @@ def split_csv_by_gamepk(source_csv, output_dir):
             writer.writerow(header)
             writer.writerows(rows)
         files_written += 1
+    StageMetrics.note(rows_out=files_written)
     return files_written
 
+@StageMetrics.instrument
 def sort_pitch_data(csv_file):
     # Open up active csv game file
     # Read the header from the source CSV
@@ -88,6 +104,9 @@ def sort_pitch_data(csv_file):
                 continue
             rows.append(row)
 
+    StageMetrics.note(game=os.path.splitext(os.path.basename(csv_file))[0].replace('game_', ''),
+                      rows_in=len(rows), rows_out=len(rows))
+
     # Sort rows by primary and optional secondary numeric keys
     rows.sort(key=lambda r: (int(r[atBatNumberIdx]), int(r[pitchNumberIdx])))
 
@@ -97,11 +116,193 @@ def sort_pitch_data(csv_file):
         writer.writerow(header)
         writer.writerows(rows)
 
+def estimate_row_bytes(row):
+    return ROW_OVERHEAD_BYTES + sum(len(field) + FIELD_OVERHEAD_BYTES for field in row)
+
+def write_sorted_run(rows, key, run_dir):
+    # Sort a buffer and spill it to a headerless temporary csv file
+    rows.sort(key=key)
+    fd, run_path = tempfile.mkstemp(suffix='.csv', dir=run_dir)
+    with os.fdopen(fd, 'w', newline='') as out:
+        csv.writer(out).writerows(rows)
+    return run_path
+
+def read_run(run_path):
+    with open(run_path, 'r', newline='') as src:
+        yield from csv.reader(src)
+
+def merge_runs(run_paths, key, run_dir):
+    # Collapse runs in passes so no more than MAX_MERGE_FANIN files are open at once.
+    # Runs are merged in spill order, and heapq.merge keeps equal keys in input
+    # order, so the result matches a stable in-memory sort
+    while len(run_paths) > MAX_MERGE_FANIN:
+        merged_paths = []
+        for start in range(0, len(run_paths), MAX_MERGE_FANIN):
+            group = run_paths[start:start + MAX_MERGE_FANIN]
+            fd, merged_path = tempfile.mkstemp(suffix='.csv', dir=run_dir)
+            with os.fdopen(fd, 'w', newline='') as out:
+                csv.writer(out).writerows(heapq.merge(*(read_run(p) for p in group), key=key))
+            for path in group:
+                os.remove(path)
+            merged_paths.append(merged_path)
+        run_paths = merged_paths
+    return run_paths
+
+@StageMetrics.instrument
+def stream_split_and_sort(source_csv, output_dir, memory_budget=DEFAULT_MEMORY_BUDGET, spill_dir=None, manifest=None):
+    # Single pass over the source: rows are routed into per-GamePk buffers and each
+    # game file is written exactly once, already sorted by (AtBatNumber, PitchNumber).
+    # When the buffered rows exceed memory_budget bytes, the largest buffer is sorted
+    # and spilled to disk as a run; spilled games are finished with an external merge.
+    # With a build manifest, games whose rows hash the same as last time are skipped
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir, exist_ok=True)
+
+    try:
+        src = open(source_csv, 'r', newline='')
+    except FileNotFoundError:
+        print(f"{source_csv} not found")
+        return 0
+
+    with src, tempfile.TemporaryDirectory(dir=spill_dir) as run_dir:
+        reader = csv.reader(src)
+        header = next(reader, None)
+        if header is None:
+            return 0
+
+        try:
+            gamepk_idx = header.index('GamePk')
+            atBatNumberIdx = header.index('AtBatNumber')
+            pitchNumberIdx = header.index('PitchNumber')
+        except ValueError as e:
+            print(f"Required column not found in CSV header: {e}")
+            return 0
+
+        def sort_key(r):
+            return (int(r[atBatNumberIdx]), int(r[pitchNumberIdx]))
+
+        game_buffers = {}
+        game_buffer_bytes = {}
+        game_runs = {}
+        game_digests = {}
+        buffered_bytes = 0
+        rows_read = 0
+
+        if manifest is not None:
+            stage_version = BuildManifest.text_digest(BuildManifest.code_version(__file__), ','.join(header))
+
+        for row in reader:
+            rows_read += 1
+            if gamepk_idx >= len(row):
+                continue
+            game_id = row[gamepk_idx]
+            if game_id == '':
+                continue
+            # Rows without an at-bat are dropped, as in sort_pitch_data
+            if row[atBatNumberIdx] == '':
+                continue
+
+            if game_id not in game_buffers:
+                game_buffers[game_id] = []
+                game_buffer_bytes[game_id] = 0
+                game_runs[game_id] = []
+                game_digests[game_id] = BuildManifest.new_digest()
+            if manifest is not None:
+                game_digests[game_id].update('\x1f'.join(row).encode('utf-8') + b'\n')
+            row_bytes = estimate_row_bytes(row)
+            game_buffers[game_id].append(row)
+            game_buffer_bytes[game_id] += row_bytes
+            buffered_bytes += row_bytes
+
+            # Spill the largest buffers until we are back under budget
+            while buffered_bytes > memory_budget:
+                largest = max(game_buffer_bytes, key=game_buffer_bytes.get)
+                if game_buffer_bytes[largest] == 0:
+                    break
+                game_runs[largest].append(write_sorted_run(game_buffers[largest], sort_key, run_dir))
+                game_buffers[largest] = []
+                buffered_bytes -= game_buffer_bytes[largest]
+                game_buffer_bytes[largest] = 0
+
+        # Write each game once, merging any spilled runs with what is still buffered
+        files_written = 0
+        for game_id, rows in game_buffers.items():
+            out_path = os.path.join(output_dir, f"game_{game_id}.csv")
+
+            if manifest is not None:
+                input_digest = BuildManifest.text_digest(stage_version, game_digests[game_id].hexdigest())
+                if BuildManifest.is_fresh(manifest, 'sort', out_path, input_digest):
+                    for path in game_runs[game_id]:
+                        os.remove(path)
+                    game_buffers[game_id] = []
+                    continue
+
+            rows.sort(key=sort_key)
+            run_paths = merge_runs(game_runs[game_id], sort_key, run_dir)
+            with open(out_path, 'w', newline='') as out:
+                writer = csv.writer(out)
+                writer.writerow(header)
+                if run_paths:
+                    writer.writerows(heapq.merge(*(read_run(p) for p in run_paths), rows, key=sort_key))
+                else:
+                    writer.writerows(rows)
+            for path in run_paths:
+                os.remove(path)
+
+            # Release the buffer as soon as its game is on disk
+            game_buffers[game_id] = []
+            files_written += 1
+
+            if manifest is not None:
+                BuildManifest.record(manifest, 'sort', out_path, input_digest, [out_path])
+
+        StageMetrics.note(rows_in=rows_read, rows_out=files_written)
+
+    return files_written
+
 def main():
-    input_name = 'AnalyticsQuestionnairePitchData.csv'
+    parser = argparse.ArgumentParser(description='Split the pitch feed into per-game files sorted by at-bat and pitch number')
+    parser.add_argument('--input', default='AnalyticsQuestionnairePitchData.csv')
+    parser.add_argument('--games-dir', default='gamesSorted')
+    parser.add_argument('--stream', action='store_true',
+                        help='split and sort in a single bounded-memory pass')
+    parser.add_argument('--memory-budget', type=int, default=DEFAULT_MEMORY_BUDGET // (1024 * 1024),
+                        help='buffered row budget in MB for --stream (default: %(default)s)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only rewrite games whose rows changed since the last run (implies --stream)')
+    parser.add_argument('--validate', action='store_true',
+                        help='check the feed first and split only its valid rows (see PitchValidation)')
+    parser.add_argument('--validated-dir', default='validated',
+                        help='where --validate writes the valid and quarantined rows (default: %(default)s)')
+    StageMetrics.add_arguments(parser)
+    args = parser.parse_args()
+    StageMetrics.start_from_args(args)
+
+    input_name = args.input
+    games_dir = args.games_dir
+
+    if args.validate:
+        # Imported here: validation needs pandas, which the sorter itself never loads
+        import PitchValidation
+        input_name = os.path.join(args.validated_dir, os.path.basename(args.input))
+        try:
+            report = PitchValidation.validate_feed(args.input, input_name)
+        except (OSError, ValueError) as e:
+            print(f"Validation failed: {e}")
+            StageMetrics.finish_from_args(args)
+            return
+        PitchValidation.print_report(report)
+
+    if args.stream or args.incremental:
+        manifest = BuildManifest.load_manifest() if args.incremental else None
+        count = stream_split_and_sort(input_name, games_dir, args.memory_budget * 1024 * 1024, manifest=manifest)
+        if manifest is not None:
+            BuildManifest.save_manifest(manifest)
+        print(f"Wrote {count} sorted per-game CSV files to '{games_dir}'")
+        StageMetrics.finish_from_args(args)
+        return
 
     # Split into per-GamePk files
-    games_dir = 'gamesSorted'
     count = split_csv_by_gamepk(input_name, games_dir)
     print(f"Wrote {count} per-game CSV files to '{games_dir}'")
 
@@ -109,6 +310,8 @@ def main():
     for file in os.listdir(games_dir):
         sort_pitch_data(os.path.join(games_dir, file))
 
+    StageMetrics.finish_from_args(args)
+
 
 
 if __name__ == "__main__":
@@ -1,52 +1,59 @@
-import pandas as pd
-import matplotlib.pyplot as plt
+import argparse
 import os
 import re
-import json
+import BuildManifest
+import LazyImport
+import PitchConfig
+import PitchStorage
+import ChartRenderer
+import StageMetrics
+from ChartRenderer import get_figure, save_figure, render_jobs
 
-def load_pitch_colors():
-    try: 
-        config_path = os.path.join('PitchColors.json')
-        with open(config_path, "r") as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Pitch color load failed.")
-        return {}
+pd = LazyImport.lazy_module('pandas')
+np = LazyImport.lazy_module('numpy')
 
+# Per-pitch inputs of a movement chart
+MOVEMENT_COLUMNS = ['PitchType', 'TrajectoryHorizontalBreak', 'TrajectoryVerticalBreakInduced']
 
-def create_movement_charts(all_pitches_data, pitcher_id, game_id):
+# Layout of a single chart saved with a fixed bbox: room on the right for the legend
+MOVEMENT_MARGINS = {'left': 0.08, 'right': 0.78, 'bottom': 0.08, 'top': 0.93}
 
-    colors_map = load_pitch_colors()
-    
-    fig, ax = plt.subplots(figsize=(10, 8))
-    
-    # Get unique pitch types and their colors for legend
-    unique_pitch_types = list(set(pitch_data['PitchType'] for pitch_data in all_pitches_data))
-    
-    # Plot all pitches with different colors for each pitch type
-    for pitch_data in all_pitches_data:
-        pitch_type = pitch_data['PitchType']
-        horizontal_break_inches = pitch_data['TrajectoryHorizontalBreak'] * 12
-        vertical_break_inches = pitch_data['TrajectoryVerticalBreakInduced'] * 12
-        
-        point_color = colors_map.get(pitch_type, '#999999')
-        
-        ax.scatter(horizontal_break_inches, vertical_break_inches, 
-                   c=point_color, s=100, alpha=0.7, edgecolors='black', linewidth=0.5)
-    
+def movement_chart_path(game_id, pitcher_id, out_dir='PitchMovementCharts'):
+    return ChartRenderer.chart_file(out_dir, f'pitch_movement_game{game_id}_pitcher{pitcher_id}')
+
+
+def movement_sheet_path(game_id, out_dir='PitchMovementCharts'):
+    return ChartRenderer.chart_file(out_dir, f'pitch_movement_game{game_id}')
+
+
+def movement_columns(pitches):
+    # A chart's pitches as {column: values}. A list of per-pitch dicts (the
+    # older job format) is accepted too
+    if isinstance(pitches, dict):
+        return pitches
+    return {column: [pitch[column] for pitch in pitches] for column in MOVEMENT_COLUMNS}
+
+
+def draw_movement(ax, pitches, config, title, fontsize=12):
+    # Scatter one pitcher's pitches on ax. Returns the pitch types drawn, in
+    # order of first appearance, for the caller's legend
+    pitch_types = pd.Series(pitches['PitchType'], dtype=object)
+    horizontal_break_inches = np.asarray(pitches['TrajectoryHorizontalBreak'], dtype=float) * 12
+    vertical_break_inches = np.asarray(pitches['TrajectoryVerticalBreakInduced'], dtype=float) * 12
+
+    # One scatter per pitch type, in order of first appearance
+    type_codes, unique_pitch_types = pd.factorize(pitch_types, use_na_sentinel=False)
+
+    for code, pitch_type in enumerate(unique_pitch_types):
+        mask = type_codes == code
+        ax.scatter(horizontal_break_inches[mask], vertical_break_inches[mask],
+                   c=config.color(pitch_type), s=100, alpha=0.7, edgecolors='black', linewidth=0.5,
+                   label=pitch_type)
 
-    legend_elements = []
-    for pitch_type in unique_pitch_types:
-        color = colors_map.get(pitch_type, '#999999')
-        legend_elements.append(plt.scatter([], [], c=color, s=100, label=pitch_type, 
-                                         edgecolors='black', linewidth=0.5))
-    
-    ax.legend(handles=legend_elements, bbox_to_anchor=(1.05, 1), loc='upper left')
-    
     # Add labels and title
-    ax.set_xlabel('Trajectory Horizontal Break (inches)', fontsize=12)
-    ax.set_ylabel('Trajectory Vertical Break Induced (inches)', fontsize=12)
-    ax.set_title(f'Pitch Movement: Game {game_id} - Pitcher {pitcher_id}', fontsize=14)
+    ax.set_xlabel('Trajectory Horizontal Break (inches)', fontsize=fontsize)
+    ax.set_ylabel('Trajectory Vertical Break Induced (inches)', fontsize=fontsize)
+    ax.set_title(title, fontsize=fontsize + 2)
     
     ax.grid(True, alpha=0.3)
     ax.axhline(y=0, color='black', linestyle='-', alpha=0.3)
@@ -54,63 +61,155 @@ def create_movement_charts(all_pitches_data, pitcher_id, game_id):
     ax.set_xlim(-20, 20)
     ax.set_ylim(-20, 20)
     ax.set_aspect('equal', adjustable='box')
-    
-    out_dir = 'PitchMovementCharts'
-    os.makedirs(out_dir, exist_ok=True)
-    outfile = os.path.join(out_dir, f'pitch_movement_game{game_id}_pitcher{pitcher_id}.png')
-    plt.savefig(outfile, bbox_inches='tight', dpi=150)
-    plt.close(fig)
+    return list(unique_pitch_types)
+
+
+@StageMetrics.instrument
+def create_movement_charts(pitches, pitcher_id, game_id):
+    # pitches: MOVEMENT_COLUMNS -> one value per pitch, breaks in feet
+    pitches = movement_columns(pitches)
+    StageMetrics.note(game=game_id, pitcher=pitcher_id, rows_in=len(pitches['PitchType']))
+
+    config = PitchConfig.load_config()
 
+    fig, ax = get_figure('movement', (10, 8), MOVEMENT_MARGINS)
+    pitch_types = draw_movement(ax, pitches, config, f'Pitch Movement: Game {game_id} - Pitcher {pitcher_id}')
 
-def get_pitcher_data(games_dir='PitcherMovement'):
+    # The legend entries are the config's prebuilt handles for those types
+    ax.legend(handles=config.legend_handles(pitch_types), bbox_to_anchor=(1.05, 1), loc='upper left')
+    
+    outfile = movement_chart_path(game_id, pitcher_id)
+    save_figure(fig, outfile)
+    StageMetrics.note(rows_out=1)
+    return outfile
+
+
+@StageMetrics.instrument
+def create_movement_sheet(game_id, jobs):
+    # Every pitcher of a game (movement_job tuples) as panels of one figure,
+    # with a single legend covering all of their pitch types
+    StageMetrics.note(game=game_id, pitchers=len(jobs))
+    config = PitchConfig.load_config()
+
+    fig, axes, legend_x = ChartRenderer.sheet_figure(len(jobs), 4)
+    # Legend types in order of first appearance; keyed by text so that every
+    # pitcher's missing type (a NaN, never equal to another) is listed once
+    pitch_types = {}
+    for ax, (pitches, pitcher_id, _) in zip(axes, jobs):
+        drawn = draw_movement(ax, movement_columns(pitches), config, f'Pitcher {pitcher_id}', fontsize=8)
+        for pitch_type in drawn:
+            pitch_types.setdefault(str(pitch_type), pitch_type)
+    pitch_types = list(pitch_types.values())
+
+    fig.suptitle(f'Pitch Movement: Game {game_id}', fontsize=14)
+    fig.legend(handles=config.legend_handles(pitch_types), loc='upper left', bbox_to_anchor=(legend_x, 0.95))
+
+    outfile = movement_sheet_path(game_id)
+    save_figure(fig, outfile)
+    ChartRenderer.close_figure(fig)
+    StageMetrics.note(rows_out=len(jobs))
+    return outfile
+
+
+def movement_job(game_id, pitcher_id, pitch_types, horizontal_break, vertical_break):
+    # One pitcher's chart job from per-pitch arrays (Series, ndarrays or lists)
+    # already in memory, e.g. a GameContext's rows
+    pitches = {
+        'PitchType': list(pitch_types),
+        'TrajectoryHorizontalBreak': np.asarray(horizontal_break, dtype=float).tolist(),
+        'TrajectoryVerticalBreakInduced': np.asarray(vertical_break, dtype=float).tolist(),
+    }
+    return (pitches, int(pitcher_id), ChartRenderer.chart_game_id(game_id))
+
+
+def movement_job_from_table(game_file, pitcher_id, game_id):
+    # Chart job from a PitcherMovement table, for when the game is no longer in
+    # memory: one point per PitchID. None when the file has no pitches
+    df = PitchStorage.read_table(game_file)
+    if 'PitchID' in df.columns:
+        df = df.drop_duplicates('PitchID')
+    if df.empty:
+        return None
+
+    def numeric(column):
+        if column not in df.columns:
+            return np.zeros(len(df))
+        return pd.to_numeric(df[column], errors='coerce')
+
+    pitch_types = df['PitchType'] if 'PitchType' in df.columns else [''] * len(df)
+    return movement_job(game_id, pitcher_id, pitch_types, numeric('TrajectoryHorizontalBreak'),
+                        numeric('TrajectoryVerticalBreakInduced'))
+
+
+def render_movement_charts(jobs, workers=1, manifest=None, batch=False):
+    # Render movement_job / movement_job_from_table output, one file per
+    # pitcher or, with batch, one sheet per game; with a build manifest, only
+    # the charts whose pitches changed
+    if batch:
+        return render_movement_sheets(jobs, workers, manifest)
+    if manifest is None:
+        return render_jobs(create_movement_charts, jobs, workers)
+    return ChartRenderer.render_stale_jobs(create_movement_charts, jobs, workers, manifest, 'movement_charts',
+                                           ChartRenderer.stage_version(__file__, PitchStorage.__file__),
+                                           lambda job: movement_chart_path(job[2], job[1]))
+
+
+def render_movement_sheets(jobs, workers=1, manifest=None):
+    sheets = ChartRenderer.group_by_game(jobs, lambda job: job[2])
+    if manifest is None:
+        return render_jobs(create_movement_sheet, sheets, workers)
+    return ChartRenderer.render_stale_jobs(create_movement_sheet, sheets, workers, manifest, 'movement_sheets',
+                                           ChartRenderer.stage_version(__file__, PitchStorage.__file__),
+                                           lambda sheet: movement_sheet_path(sheet[0]))
+
+
+def get_pitcher_data(games_dir='PitcherMovement', workers=1, manifest=None, batch=False):
+    # Fallback that recovers the pitches from the movement files on disk
 
     if not os.path.exists(games_dir):
         return
 
+    jobs = []
+
     for filename in os.listdir(games_dir):
-        if filename.endswith('.csv'):
+        if PitchStorage.format_of(filename) is not None:
             game_file = os.path.join(games_dir, filename)
 
             match = re.search(r'Pitcher(\d+)MetricsGame(\d+)', filename)
             pitcher_id = int(match.group(1)) if match else 0
             game_id = int(match.group(2)) if match else 0
 
-            df = pd.read_csv(game_file)
-
-            def to_float_safe(value):
-                try:
-                    return float(value)
-                except (TypeError, ValueError):
-                    return 0.0
-
-            def to_int_safe(value):
-                try:
-                    return int(value)
-                except (TypeError, ValueError):
-                    return 0
-
-            # Collect all pitch data from this file
-            all_pitches_data = []
-            
-            for pitch_id in df['PitchID'].unique():
-                pitch_movement_data = df[df['PitchID'] == pitch_id]
-
-                pitch_data = {
-                    'GameId': game_id,
-                    'PitcherId': to_int_safe(pitcher_id),
-                    'PitchType': pitch_movement_data['PitchType'].iloc[0] if 'PitchType' in pitch_movement_data.columns and not pitch_movement_data['PitchType'].empty else '',
-                    'TrajectoryHorizontalBreak': to_float_safe(pitch_movement_data['TrajectoryHorizontalBreak'].iloc[0] if 'TrajectoryHorizontalBreak' in pitch_movement_data.columns and not pitch_movement_data['TrajectoryHorizontalBreak'].empty else 0),
-                    'TrajectoryVerticalBreakInduced': to_float_safe(pitch_movement_data['TrajectoryVerticalBreakInduced'].iloc[0] if 'TrajectoryVerticalBreakInduced' in pitch_movement_data.columns and not pitch_movement_data['TrajectoryVerticalBreakInduced'].empty else 0),
-                }
-                
-                all_pitches_data.append(pitch_data)
-
             # Create one chart for all pitches in this file
-            if all_pitches_data:
-                create_movement_charts(all_pitches_data, pitcher_id, game_id)
+            job = movement_job_from_table(game_file, pitcher_id, game_id)
+            if job is not None:
+                jobs.append(job)
+
+    render_movement_charts(jobs, workers, manifest, batch)
 
 def main():
-    get_pitcher_data()
+    parser = argparse.ArgumentParser(description='Render pitch movement charts from the PitcherMovement files')
+    parser.add_argument('--games-dir', default='PitcherMovement')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of rendering processes (default: %(default)s)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only redraw charts whose data changed since the last run')
+    ChartRenderer.add_arguments(parser)
+    StageMetrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    ChartRenderer.set_output_from_args(parser, args)
+    StageMetrics.start_from_args(args)
+    try:
+        PitchConfig.load_config()
+    except (OSError, ValueError) as e:
+        print(f"Pitch color load failed: {e}")
+        return
+
+    manifest = BuildManifest.load_manifest() if args.incremental else None
+    get_pitcher_data(args.games_dir, args.workers, manifest, args.batch)
+    if manifest is not None:
+        BuildManifest.save_manifest(manifest)
+    StageMetrics.finish_from_args(args)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,121 @@
+import argparse
+import time
+
+import LazyImport
+
+np = LazyImport.lazy_module('numpy')
+pd = LazyImport.lazy_module('pandas')
+
+# Per-pitch metrics derived from the tracking fit, for every pitch at once.
+# The feed's trajectory is the polynomial
+#   position(t) = P0 + P1 t + P2 t^2   (feet, seconds; P = TrajectoryPolynomialX/Y/Z)
+# with y measured from the tip of home plate towards the mound, and
+# SpinVectorX/Y/Z is the spin axis scaled by the spin rate (rpm)
+
+# The plate is "crossed" at the front edge of home plate
+PLATE_Y = 17 / 12
+
+FEET_PER_SECOND_TO_MPH = 3600 / 5280
+
+# Columns added to the PitcherMovement files, with the decimals each is rounded to
+PHYSICS_COLUMNS = {
+    'PlateX': 4,
+    'PlateZ': 4,
+    'PlateTime': 5,
+    'FlightTime': 5,
+    'PlateSpeed': 3,
+    'VerticalApproachAngle': 3,
+    'HorizontalApproachAngle': 3,
+    'ActiveSpin': 1,
+    'SpinEfficiency': 4,
+}
+
+# Feed columns the derivations read
+PHYSICS_INPUT_COLUMNS = [
+    f"TrajectoryPolynomial{axis}{power}" for axis in 'XYZ' for power in range(3)
+] + ['ReleasePositionY', 'SpinVectorX', 'SpinVectorY', 'SpinVectorZ']
+
+
+def time_at_y(y0, y1, y2, y):
+    # Earliest t >= 0 with y0 + y1 t + y2 t^2 == y, for a pitch travelling
+    # towards the plate (y1 < 0). Written as 2c / (-b + sqrt(b^2 - 4ac)) so it
+    # stays accurate when y2 is tiny and is still defined when y2 == 0
+    c = y0 - y
+    discriminant = np.sqrt(y1 * y1 - 4 * y2 * c)
+    return 2 * c / (-y1 + discriminant)
+
+
+def derive_pitch_physics(df):
+    # DataFrame of PHYSICS_COLUMNS, one row per row of df (same index). Rows
+    # without tracking data come out NaN
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = {name: df[name].to_numpy(dtype='float64', na_value=np.nan) for name in PHYSICS_INPUT_COLUMNS}
+        x0, x1, x2 = p['TrajectoryPolynomialX0'], p['TrajectoryPolynomialX1'], p['TrajectoryPolynomialX2']
+        y0, y1, y2 = p['TrajectoryPolynomialY0'], p['TrajectoryPolynomialY1'], p['TrajectoryPolynomialY2']
+        z0, z1, z2 = p['TrajectoryPolynomialZ0'], p['TrajectoryPolynomialZ1'], p['TrajectoryPolynomialZ2']
+
+        # Plate crossing: location, and time since the start of the fit
+        t = time_at_y(y0, y1, y2, PLATE_Y)
+        plate_x = x0 + (x1 + x2 * t) * t
+        plate_z = z0 + (z1 + z2 * t) * t
+
+        # Velocity at the plate and the angles it makes with the y axis. A pitch
+        # that is dropping gets a negative vertical approach angle
+        vx = x1 + 2 * x2 * t
+        vy = y1 + 2 * y2 * t
+        vz = z1 + 2 * z2 * t
+        vertical_angle = -np.degrees(np.arctan(vz / vy))
+        horizontal_angle = np.degrees(np.arctan(vx / vy))
+        plate_speed = np.sqrt(vx * vx + vy * vy + vz * vz) * FEET_PER_SECOND_TO_MPH
+
+        # Release to plate: the release point may sit slightly before t = 0
+        release_t = time_at_y(y0, y1, y2, p['ReleasePositionY'])
+        flight_time = t - release_t
+
+        # Active spin is the part of the spin perpendicular to the direction of
+        # travel at release (the rest is gyro spin, which does not move the ball)
+        rx = x1 + 2 * x2 * release_t
+        ry = y1 + 2 * y2 * release_t
+        rz = z1 + 2 * z2 * release_t
+        speed = np.sqrt(rx * rx + ry * ry + rz * rz)
+        sx, sy, sz = p['SpinVectorX'], p['SpinVectorY'], p['SpinVectorZ']
+        gyro = (sx * rx + sy * ry + sz * rz) / speed
+        total_spin = np.sqrt(sx * sx + sy * sy + sz * sz)
+        active_spin = np.sqrt(np.maximum(total_spin * total_spin - gyro * gyro, 0))
+        spin_efficiency = np.where(total_spin > 0, active_spin / total_spin, np.nan)
+
+    values = {
+        'PlateX': plate_x,
+        'PlateZ': plate_z,
+        'PlateTime': t,
+        'FlightTime': flight_time,
+        'PlateSpeed': plate_speed,
+        'VerticalApproachAngle': vertical_angle,
+        'HorizontalApproachAngle': horizontal_angle,
+        'ActiveSpin': active_spin,
+        'SpinEfficiency': spin_efficiency,
+    }
+    return pd.DataFrame({name: np.round(values[name], decimals) for name, decimals in PHYSICS_COLUMNS.items()},
+                        index=df.index)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Derive plate crossing, approach angle, spin and flight time metrics')
+    parser.add_argument('input', help='pitch feed or sorted game file')
+    parser.add_argument('--output', help='write the input rows plus the derived columns to this CSV')
+    args = parser.parse_args()
+
+    df = pd.read_csv(args.input)
+    start = time.perf_counter()
+    physics = derive_pitch_physics(df)
+    elapsed = time.perf_counter() - start
+    print(f"Derived {len(PHYSICS_COLUMNS)} metrics for {len(df)} pitches in {elapsed:.3f} s")
+
+    if args.output:
+        pd.concat([df, physics], axis=1).to_csv(args.output, index=False)
+    else:
+        print(physics.describe().T.to_string())
+
+
+if __name__ == "__main__":
+    main()
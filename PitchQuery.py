@@ -0,0 +1,223 @@
+import argparse
+import json
+import os
+import sys
+import time
+
+import LazyImport
+import PitchSchema
+import PitchStorage
+
+np = LazyImport.lazy_module('numpy')
+pd = LazyImport.lazy_module('pandas')
+
+# Indexed lookups over every pitch in the sorted game files, e.g.
+#   index = open_index()
+#   index.query(pitcher=11, pitch_type='SL', count='0-2')
+#
+# All pitches are stored once as a single memory-mapped table. For each indexed
+# column the index keeps the row numbers sorted by value (a posting list per
+# value, found by binary search on the distinct keys), so a filter resolves by
+# intersecting the posting lists of its predicates instead of scanning rows.
+# The index lives in index_dir and is rebuilt when the game files change
+INDEX_DIR = 'PitchIndex'
+
+INDEX_VERSION = 2
+
+# Indexed columns and the query keyword for each
+INDEXED_COLUMNS = {
+    'pitcher': 'PitcherId',
+    'game': 'GamePk',
+    'pitch_type': 'PitchType',
+    'balls': 'Balls',
+    'strikes': 'Strikes',
+    'inning': 'Inning',
+    'is_top': 'IsTop',
+}
+
+
+def source_state(games_dir):
+    # Size and mtime of every game file: the index is stale when this changes
+    state = {}
+    for filename in PitchStorage.list_tables(games_dir):
+        stat = os.stat(os.path.join(games_dir, filename))
+        state[filename] = [stat.st_size, stat.st_mtime_ns]
+    return state
+
+
+def _posting_lists(values):
+    # (keys, starts, order): rows order[starts[i]:starts[i + 1]] hold keys[i],
+    # in ascending row order. Missing values are left out of the index
+    values = np.asarray(values)
+    if values.dtype.kind == 'U':
+        present = np.flatnonzero(values != '')
+    else:
+        present = np.flatnonzero(~np.isnan(values))
+    order = present[np.argsort(values[present], kind='stable')]
+    keys, starts = np.unique(values[order], return_index=True)
+    return keys, np.append(starts, len(order)), order
+
+
+def build_index(games_dir='gamesSorted', index_dir=INDEX_DIR):
+    frames = []
+    for filename in PitchStorage.list_tables(games_dir):
+        frames.append(PitchSchema.read_pitches(os.path.join(games_dir, filename)))
+    if not frames:
+        raise ValueError(f"No game files found in '{games_dir}'")
+    df = pd.concat(frames, ignore_index=True)
+
+    os.makedirs(index_dir, exist_ok=True)
+    PitchStorage.write_table(df, os.path.join(index_dir, 'pitches'), 'npy')
+    table = PitchStorage.read_columns(os.path.join(index_dir, 'pitches.npy'))
+    for column in INDEXED_COLUMNS.values():
+        keys, starts, order = _posting_lists(table[column])
+        np.save(os.path.join(index_dir, f"{column}.keys.npy"), keys, allow_pickle=False)
+        np.save(os.path.join(index_dir, f"{column}.starts.npy"), starts, allow_pickle=False)
+        np.save(os.path.join(index_dir, f"{column}.order.npy"), order, allow_pickle=False)
+
+    # Written last: a build that was interrupted leaves no (or a stale) meta file
+    meta = {'version': INDEX_VERSION, 'games_dir': os.path.abspath(games_dir),
+            'sources': source_state(games_dir), 'rows': len(df)}
+    with open(os.path.join(index_dir, 'meta.json'), 'w') as f:
+        json.dump(meta, f, indent=1, sort_keys=True)
+    return len(df)
+
+
+def index_is_current(games_dir='gamesSorted', index_dir=INDEX_DIR):
+    try:
+        with open(os.path.join(index_dir, 'meta.json'), 'r') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return (meta.get('version') == INDEX_VERSION
+            and meta.get('games_dir') == os.path.abspath(games_dir)
+            and meta.get('sources') == source_state(games_dir))
+
+
+def parse_count(count):
+    # '0-2' -> (0, 2)
+    balls, strikes = str(count).split('-')
+    return int(balls), int(strikes)
+
+
+class PitchIndex:
+
+    def __init__(self, index_dir=INDEX_DIR):
+        self.index_dir = index_dir
+        self.columns = PitchStorage.read_columns(os.path.join(index_dir, 'pitches.npy'))
+        self.lists = {}
+        for column in INDEXED_COLUMNS.values():
+            self.lists[column] = tuple(
+                np.load(os.path.join(index_dir, f"{column}.{part}.npy"), mmap_mode='r', allow_pickle=False)
+                for part in ('keys', 'starts', 'order')
+            )
+
+    def __len__(self):
+        return len(next(iter(self.columns.values())))
+
+    def posting_list(self, column, value):
+        # Row numbers (ascending) where column == value
+        keys, starts, order = self.lists[column]
+        i = np.searchsorted(keys, value)
+        if i < len(keys) and keys[i] == value:
+            return order[starts[i]:starts[i + 1]]
+        return np.empty(0, dtype=np.int64)
+
+    def rows(self, pitcher=None, game=None, pitch_type=None, count=None, balls=None, strikes=None,
+             inning=None, is_top=None):
+        # Row numbers matching every given predicate. A predicate may be a single
+        # value or a list of values (any of which matches)
+        if count is not None:
+            balls, strikes = parse_count(count)
+        predicates = {'pitcher': pitcher, 'game': game, 'pitch_type': pitch_type, 'balls': balls,
+                      'strikes': strikes, 'inning': inning,
+                      'is_top': None if is_top is None else int(is_top)}
+
+        matches = []
+        for keyword, value in predicates.items():
+            if value is None:
+                continue
+            column = INDEXED_COLUMNS[keyword]
+            if isinstance(value, (list, tuple, set)):
+                lists = [self.posting_list(column, v) for v in set(value)]
+                matches.append(np.sort(np.concatenate(lists)) if lists else np.empty(0, dtype=np.int64))
+            else:
+                matches.append(self.posting_list(column, value))
+
+        if not matches:
+            return np.arange(len(self))
+
+        # Intersect the shortest lists first so the working set only shrinks
+        matches.sort(key=len)
+        result = np.asarray(matches[0])
+        for match in matches[1:]:
+            if len(result) == 0:
+                break
+            result = np.intersect1d(result, match, assume_unique=True)
+        return result
+
+    def count(self, **predicates):
+        return len(self.rows(**predicates))
+
+    def query(self, columns=None, **predicates):
+        # DataFrame of the matching pitches, in sorted game order
+        return self.frame(self.rows(**predicates), columns)
+
+    def frame(self, rows, columns=None):
+        # DataFrame of the given row numbers (from rows())
+        names = columns if columns is not None else list(self.columns)
+        df = pd.DataFrame({name: self.columns[name][rows] for name in names})
+        # Missing strings are stored as '' in the table
+        for name in names:
+            if df[name].dtype == object:
+                df[name] = df[name].astype(object).where(df[name] != '', np.nan)
+        return df
+
+
+def open_index(games_dir='gamesSorted', index_dir=INDEX_DIR, rebuild=False):
+    # Load the persistent index, (re)building it first if the game files changed
+    if rebuild or not index_is_current(games_dir, index_dir):
+        build_index(games_dir, index_dir)
+    return PitchIndex(index_dir)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Query the sorted pitch data through a persistent index')
+    parser.add_argument('--games-dir', default='gamesSorted')
+    parser.add_argument('--index-dir', default=INDEX_DIR)
+    parser.add_argument('--rebuild', action='store_true', help='rebuild the index even if it is current')
+    parser.add_argument('--pitcher', type=int, nargs='+')
+    parser.add_argument('--game', type=int, nargs='+')
+    parser.add_argument('--pitch-type', nargs='+')
+    parser.add_argument('--count', help="ball-strike count, e.g. 0-2")
+    parser.add_argument('--balls', type=int)
+    parser.add_argument('--strikes', type=int)
+    parser.add_argument('--inning', type=int, nargs='+')
+    half = parser.add_mutually_exclusive_group()
+    half.add_argument('--top', dest='is_top', action='store_const', const=1)
+    half.add_argument('--bottom', dest='is_top', action='store_const', const=0)
+    parser.add_argument('--columns', nargs='+', help='columns to print (default: all)')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.games_dir):
+        print(f"Directory {args.games_dir} does not exist")
+        return
+
+    index = open_index(args.games_dir, args.index_dir, args.rebuild)
+
+    # The lookup is timed on its own: building the DataFrame (and the first
+    # pandas import) costs far more than finding the rows
+    start = time.perf_counter()
+    rows = index.rows(pitcher=args.pitcher, game=args.game, pitch_type=args.pitch_type, count=args.count,
+                      balls=args.balls, strikes=args.strikes, inning=args.inning, is_top=args.is_top)
+    lookup = time.perf_counter() - start
+    df = index.frame(rows, args.columns)
+    build = time.perf_counter() - start - lookup
+
+    df.to_csv(sys.stdout, index=False)
+    print(f"{len(rows)} of {len(index)} pitches matched in {lookup * 1000:.3f} ms "
+          f"(table built in {build * 1000:.1f} ms)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
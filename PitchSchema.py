@@ -0,0 +1,193 @@
+import argparse
+
+import LazyImport
+import PitchConfig
+import PitchStorage
+
+np = LazyImport.lazy_module('numpy')
+pd = LazyImport.lazy_module('pandas')
+
+# One compact in-memory representation of pitch rows, shared by every module
+# that parses pitch data:
+#   - string columns are categoricals over a fixed vocabulary (values outside it
+#     are appended, never dropped)
+#   - IDs, counts and innings are the smallest integer type that holds them,
+#     nullable only when the column actually has missing values. A column with
+#     a value too large for its usual type keeps a wider one instead of
+#     wrapping around
+#   - physics columns are float32, except the ones written back out verbatim
+
+def _pitch_color_keys():
+    # The pitch types PitchColors.json knows, in its order. A broken config is
+    # reported by the chart stages; here it only leaves those types unordered
+    try:
+        return PitchConfig.load_config().pitch_types
+    except (OSError, ValueError):
+        return []
+
+# Other Statcast pitch type codes, after the ones with a chart color
+PITCH_TYPE_EXTRAS = ['FS', 'ST', 'SV', 'KN', 'EP', 'FO', 'SC', 'CS', 'FA', 'PO', 'UN']
+
+PITCH_CALL_VOCABULARY = [
+    'ball', 'blocked_ball', 'called_strike', 'swinging_strike', 'swinging_strike_blocked', 'foul_tip', 'foul',
+    'foul_bunt', 'missed_bunt', 'bunt_foul_tip', 'hit_by_pitch', 'pitchout', 'field_out', 'force_out',
+    'grounded_into_double_play', 'double_play', 'fielders_choice', 'fielders_choice_out', 'field_error',
+    'single', 'double', 'triple', 'home_run', 'strikeout', 'strikeout_double_play', 'walk', 'intent_walk',
+    'sac_bunt', 'sac_fly', 'catcher_interf', 'pickoff_attempt_1b', 'pickoff_attempt_2b', 'pickoff_attempt_3b',
+    'stolen_base_2b', 'stolen_base_3b', 'stolen_base_home', 'caught_stealing_2b', 'caught_stealing_3b',
+    'caught_stealing_home', 'wild_pitch', 'passed_ball', 'balk'
+]
+
+PITCH_COLOR_KEYS = _pitch_color_keys()
+
+CATEGORY_VOCABULARIES = {
+    'PitchType': PITCH_COLOR_KEYS + [t for t in PITCH_TYPE_EXTRAS if t not in PITCH_COLOR_KEYS],
+    'PitchCall': PITCH_CALL_VOCABULARY,
+    'PitcherHand': ['L', 'R'],
+    'BatterSide': ['L', 'R'],
+}
+
+INTEGER_COLUMNS = {
+    'PitchId': 'int32',
+    'GamePk': 'int32',
+    'BatterId': 'int32',
+    'PitcherId': 'int32',
+    'Inning': 'int8',
+    'IsTop': 'int8',
+    'Balls': 'int8',
+    'Strikes': 'int8',
+    'Outs': 'int8',
+    'PostBalls': 'int8',
+    'PostStrikes': 'int8',
+    'PostOuts': 'int8',
+    'PitchNumber': 'int8',
+    'AtBatNumber': 'int16',
+    'AwayTeamID': 'int16',
+    'VenueID': 'int32',
+    'HomeTeamID': 'int16',
+}
+
+# Copied unchanged into the PitcherMovement files, so they stay float64 and
+# print exactly as the feed wrote them. Every other number is float32
+FLOAT64_COLUMNS = [
+    'ReleaseSpeed', 'TrajectoryHorizontalBreak', 'TrajectoryVerticalBreakInduced',
+    'ReleasePositionX', 'ReleasePositionZ'
+]
+
+
+def read_dtypes(columns=None, float64_columns=()):
+    # dtype argument for pd.read_csv: parse straight into the narrow types.
+    # Integers are read as nullable int64, since a file may have gaps and
+    # pandas wraps values that overflow a narrower type; apply_schema narrows
+    # them once it has checked that they fit. float64_columns: other columns a
+    # caller copies out verbatim and so wants at full precision
+    if columns is None:
+        columns = list(CATEGORY_VOCABULARIES) + list(INTEGER_COLUMNS) + FLOAT64_COLUMNS
+    dtypes = {}
+    for column in columns:
+        if column in CATEGORY_VOCABULARIES:
+            dtypes[column] = 'category'
+        elif column in INTEGER_COLUMNS:
+            dtypes[column] = 'Int64'
+        elif column in FLOAT64_COLUMNS or column in float64_columns:
+            dtypes[column] = 'float64'
+    return dtypes
+
+
+def as_category(values, vocabulary):
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        present = values.cat.categories
+    else:
+        present = values.dropna().unique()
+    extras = sorted(set(present) - set(vocabulary))
+    return values.astype(pd.CategoricalDtype(vocabulary + extras))
+
+
+def integer_dtype(values, dtype):
+    # dtype, or the next wider integer type that holds every value of the column
+    for candidate in ('int8', 'int16', 'int32', 'int64'):
+        if np.iinfo(candidate).bits < np.iinfo(dtype).bits:
+            continue
+        limits = np.iinfo(candidate)
+        if values.empty or (values.min() >= limits.min and values.max() <= limits.max):
+            return candidate
+    return 'int64'
+
+
+def apply_schema(df, float64_columns=()):
+    # Convert a parsed pitch DataFrame (from any reader) to the schema types.
+    # Columns the schema does not know keep their dtype unless numeric
+    columns = {}
+    for column in df.columns:
+        values = df[column]
+        if column in CATEGORY_VOCABULARIES:
+            values = as_category(values, CATEGORY_VOCABULARIES[column])
+        elif column in INTEGER_COLUMNS:
+            dtype = integer_dtype(values.dropna(), INTEGER_COLUMNS[column])
+            values = values.astype(dtype.capitalize() if values.isna().any() else dtype)
+        elif column in FLOAT64_COLUMNS or column in float64_columns:
+            values = values.astype('float64')
+        elif pd.api.types.is_float_dtype(values.dtype):
+            values = values.astype('float32')
+        columns[column] = values
+    return pd.DataFrame(columns, index=df.index)
+
+
+def read_pitches(path, columns=None, float64_columns=()):
+    # Pitch rows from a feed or sorted game file (any storage format), typed by
+    # the schema
+    df = PitchStorage.read_table(path, columns=columns, dtype=read_dtypes(columns, float64_columns))
+    return apply_schema(df, float64_columns)
+
+
+def read_pitch_chunks(path, chunk_size, columns=None, float64_columns=()):
+    # read_pitches one piece of at most chunk_size rows at a time
+    for chunk in PitchStorage.read_table_chunks(path, chunk_size, columns=columns,
+                                                dtype=read_dtypes(columns, float64_columns)):
+        yield apply_schema(chunk, float64_columns)
+
+
+def bytes_per_pitch(df):
+    return df.memory_usage(deep=True, index=False).sum() / max(len(df), 1)
+
+
+def memory_report(path):
+    # Bytes per pitch with pandas' default types and with the schema, and
+    # whether the pitcher and hitter counters come out identical
+    import HitterResultsGenerator
+    import PitcherResultsGenerator
+
+    default = pd.read_csv(path)
+    compact = read_pitches(path)
+
+    identical = True
+    for counts in (PitcherResultsGenerator.calculate_pitcher_counts, HitterResultsGenerator.calculate_hitter_counts):
+        before = counts(default)
+        after = counts(compact)
+        identical &= (list(before.index) == list(after.index)
+                      and before.to_dict('records') == after.to_dict('records'))
+
+    return {
+        'pitches': len(default),
+        'default_bytes_per_pitch': round(bytes_per_pitch(default), 1),
+        'schema_bytes_per_pitch': round(bytes_per_pitch(compact), 1),
+        'reduction': round(bytes_per_pitch(default) / bytes_per_pitch(compact), 2),
+        'identical_stats': identical,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Report the memory used per pitch with and without the schema')
+    parser.add_argument('--input', default='AnalyticsQuestionnairePitchData.csv')
+    args = parser.parse_args()
+
+    report = memory_report(args.input)
+    print(f"{report['pitches']} pitches")
+    print(f"default types: {report['default_bytes_per_pitch']:>8} bytes/pitch")
+    print(f"schema types:  {report['schema_bytes_per_pitch']:>8} bytes/pitch")
+    print(f"reduction:     {report['reduction']:>8}x")
+    print(f"pitcher and hitter counts identical: {'yes' if report['identical_stats'] else 'NO'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+import os
+
+import LazyImport
+
+np = LazyImport.lazy_module('numpy')
+pd = LazyImport.lazy_module('pandas')
+
+# Storage formats for the tables handed between pipeline stages. CSV stays the
+# default export; the binary formats keep column dtypes so the next stage does
+# not re-parse numbers from text:
+#   parquet - compressed columnar file (needs pyarrow)
+#   feather - uncompressed Arrow IPC file, memory-mapped on read (needs pyarrow)
+#   npy     - one structured NumPy array, memory-mapped on read (NumPy only)
+FORMAT_EXTENSIONS = {
+    'csv': '.csv',
+    'parquet': '.parquet',
+    'feather': '.feather',
+    'npy': '.npy',
+}
+FORMATS = list(FORMAT_EXTENSIONS) + ['auto']
+
+def has_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def resolve_format(fmt):
+    # 'auto' picks the best zero-copy format available in this environment
+    if fmt == 'auto':
+        return 'feather' if has_pyarrow() else 'npy'
+    if fmt not in FORMAT_EXTENSIONS:
+        raise ValueError(f"Unknown storage format '{fmt}' (expected one of {', '.join(FORMATS)})")
+    return fmt
+
+def format_of(path):
+    for fmt, extension in FORMAT_EXTENSIONS.items():
+        if path.endswith(extension):
+            return fmt
+    return None
+
+def table_path(base_path, fmt='csv'):
+    # base_path has no extension, e.g. 'PitcherMovement/Pitcher1MetricsGame1'
+    return base_path + FORMAT_EXTENSIONS[resolve_format(fmt)]
+
+def strip_extension(filename):
+    fmt = format_of(filename)
+    return filename[:-len(FORMAT_EXTENSIONS[fmt])] if fmt else filename
+
+def list_tables(directory):
+    # Filenames of every table in a directory, in any supported format
+    return sorted(f for f in os.listdir(directory) if format_of(f) is not None)
+
+def _to_structured(df):
+    # Strings become fixed-width unicode (missing -> ''), nullable integers with
+    # missing values become float64 with NaN, everything else keeps its dtype
+    fields = []
+    arrays = []
+    for column in df.columns:
+        values = df[column]
+        if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+            array = values.astype(object).where(values.notna(), '').astype(str).to_numpy(dtype=str)
+        elif pd.api.types.is_extension_array_dtype(values.dtype):
+            if values.isna().any():
+                array = values.to_numpy(dtype='float64', na_value=np.nan)
+            else:
+                array = values.to_numpy(dtype=values.dtype.numpy_dtype)
+        else:
+            array = values.to_numpy()
+        fields.append((str(column), array.dtype))
+        arrays.append(array)
+
+    table = np.empty(len(df), dtype=fields)
+    for (name, _), array in zip(fields, arrays):
+        table[name] = array
+    return table
+
+def write_table(df, base_path, fmt='csv'):
+    fmt = resolve_format(fmt)
+    path = table_path(base_path, fmt)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+    if fmt == 'csv':
+        df.to_csv(path, index=False)
+    elif fmt == 'parquet':
+        df.to_parquet(path, index=False)
+    elif fmt == 'feather':
+        df.reset_index(drop=True).to_feather(path)
+    else:
+        np.save(path, _to_structured(df), allow_pickle=False)
+    return path
+
+def read_columns(path, columns=None):
+    # Dict of column name -> NumPy array. For npy and feather the numeric arrays
+    # are views onto the memory-mapped file rather than copies
+    fmt = format_of(path)
+    if fmt == 'npy':
+        table = np.load(path, mmap_mode='r', allow_pickle=False)
+        names = columns if columns is not None else table.dtype.names
+        return {name: table[name] for name in names}
+    if fmt in ('feather', 'parquet'):
+        import pyarrow.feather as feather
+        import pyarrow.parquet as parquet
+        if fmt == 'feather':
+            table = feather.read_table(path, columns=columns, memory_map=True)
+        else:
+            table = parquet.read_table(path, columns=columns)
+        return {name: table.column(name).to_numpy() for name in table.column_names}
+    df = pd.read_csv(path, usecols=columns)
+    return {name: df[name].to_numpy() for name in df.columns}
+
+def read_table(path, columns=None, dtype=None):
+    fmt = format_of(path)
+    if fmt == 'csv' or fmt is None:
+        return pd.read_csv(path, usecols=columns, dtype=dtype)
+    if fmt == 'parquet':
+        df = pd.read_parquet(path, columns=columns)
+    elif fmt == 'feather':
+        import pyarrow.feather as feather
+        df = feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+    else:
+        df = _frame_from_arrays(read_columns(path, columns))
+
+    return _apply_dtype(df, dtype)
+
+def read_table_chunks(path, chunk_size, columns=None, dtype=None):
+    # read_table in consecutive pieces of at most chunk_size rows, so a table
+    # larger than memory can be processed one piece at a time. CSV and parquet
+    # are streamed; npy and feather are memory-mapped and sliced
+    fmt = format_of(path)
+    if fmt == 'csv' or fmt is None:
+        yield from pd.read_csv(path, usecols=columns, dtype=dtype, chunksize=chunk_size)
+    elif fmt == 'parquet':
+        import pyarrow.parquet as parquet
+        start = 0
+        for batch in parquet.ParquetFile(path).iter_batches(batch_size=chunk_size, columns=columns):
+            df = batch.to_pandas()
+            df.index += start
+            start += len(df)
+            yield _apply_dtype(df, dtype)
+    elif fmt == 'feather':
+        import pyarrow.feather as feather
+        table = feather.read_table(path, columns=columns, memory_map=True)
+        for start in range(0, table.num_rows, chunk_size):
+            df = table.slice(start, chunk_size).to_pandas()
+            df.index += start
+            yield _apply_dtype(df, dtype)
+    else:
+        arrays = read_columns(path, columns)
+        rows = len(next(iter(arrays.values()))) if arrays else 0
+        for start in range(0, rows, chunk_size):
+            chunk = {name: array[start:start + chunk_size] for name, array in arrays.items()}
+            df = _frame_from_arrays(chunk)
+            df.index += start
+            yield _apply_dtype(df, dtype)
+
+def _frame_from_arrays(arrays):
+    df = pd.DataFrame(arrays, copy=False)
+    # Restore missing strings that were stored as ''
+    for name, array in arrays.items():
+        if array.dtype.kind == 'U':
+            df[name] = df[name].astype(object).where(df[name] != '', np.nan)
+    return df
+
+def _apply_dtype(df, dtype):
+    if dtype:
+        df = df.astype({k: v for k, v in dtype.items() if k in df.columns})
+    return df
@@ -0,0 +1,190 @@
+import argparse
+import csv
+import json
+import os
+import time
+
+import LazyImport
+import PitchSchema
+import PitchStorage
+import StageMetrics
+from PitcherResultsGenerator import CSV_NA_VALUES, GAME_COLUMNS
+
+np = LazyImport.lazy_module('numpy')
+pd = LazyImport.lazy_module('pandas')
+
+# One vectorized check of the raw feed, run before it is split into games, so
+# the stages after it can trust every column's type:
+#   - every column the pipeline reads must be in the header
+#   - integer columns (PitchSchema.INTEGER_COLUMNS) must hold whole numbers
+#     written as integers, since the sorter's keys go through int(), within
+#     int64 (the schema readers widen a column rather than wrap a value, but
+#     cannot read one beyond int64)
+#   - the remaining numeric columns must parse with pd.to_numeric
+#   - text columns (PitchSchema.CATEGORY_VOCABULARIES) may hold anything
+# Rows with a missing or invalid sort key cannot be placed in a game and are
+# moved to a quarantine file, with the reason. Any other invalid value is
+# cleared (read as missing downstream), or with strict the row is quarantined
+# too. Valid rows are written exactly as they appeared in the feed
+
+# Columns a row cannot do without
+KEY_COLUMNS = ['GamePk', 'AtBatNumber', 'PitchNumber']
+
+REQUIRED_COLUMNS = KEY_COLUMNS + [column for column in GAME_COLUMNS if column not in KEY_COLUMNS]
+
+TEXT_COLUMNS = set(PitchSchema.CATEGORY_VOCABULARIES)
+
+NA_VALUES = set(CSV_NA_VALUES)
+
+INTEGER_PATTERN = r'[+-]?\d+'
+
+REASON_COLUMN = 'QuarantineReason'
+
+
+def missing_columns(columns):
+    return [column for column in REQUIRED_COLUMNS if column not in columns]
+
+
+def table_columns(path):
+    # Header of a table, without reading its rows when it is a CSV
+    if PitchStorage.format_of(path) in ('csv', None):
+        with open(path, 'r', newline='') as f:
+            return next(csv.reader(f), [])
+    return list(PitchStorage.read_table(path).columns)
+
+
+def column_problems(values, column):
+    # (null, invalid) boolean masks of one column of feed text
+    null = values.isin(NA_VALUES)
+    if column in TEXT_COLUMNS:
+        return null, np.zeros(len(values), dtype=bool)
+    numbers = pd.to_numeric(values.where(~null), errors='coerce')
+    if column not in PitchSchema.INTEGER_COLUMNS:
+        valid = numbers.notna()
+    elif pd.api.types.is_integer_dtype(numbers.dtype):
+        # Every value parsed as an integer: no need to look at the text
+        valid = pd.Series(True, index=values.index)
+    else:
+        valid = values.str.strip().str.fullmatch(INTEGER_PATTERN).fillna(False).astype(bool)
+    if column in PitchSchema.INTEGER_COLUMNS:
+        # PitchSchema.read_dtypes reads integers as int64
+        limits = np.iinfo('int64')
+        valid &= numbers.between(limits.min, limits.max).to_numpy()
+    return null, ~null & ~valid
+
+
+def validate_frame(raw, strict=False):
+    # raw: the feed as text (dtype=str, keep_default_na=False). Returns
+    # (clean rows, quarantined rows with REASON_COLUMN, report). Raises
+    # ValueError when required columns are missing
+    missing = missing_columns(raw.columns)
+    if missing:
+        raise ValueError(f"Feed is missing required columns: {', '.join(missing)}")
+
+    report = {'rows': len(raw), 'columns': {}}
+    quarantine = np.zeros(len(raw), dtype=bool)
+    reasons = pd.Series('', index=raw.index)
+    clear = {}
+    for column in raw.columns:
+        values = raw[column]
+        null, invalid = column_problems(values, column)
+        report['columns'][column] = {'nulls': int(null.sum()), 'invalid': int(invalid.sum())}
+
+        bad = (null | invalid) if column in KEY_COLUMNS else (invalid if strict else None)
+        if bad is not None and bad.any():
+            quarantine |= np.asarray(bad)
+            reason = np.where(null, f"{column} missing", f"{column} invalid")
+            reasons[bad] = reasons[bad] + np.where(reasons[bad] == '', '', '; ') + reason[np.asarray(bad)]
+        elif invalid.any():
+            clear[column] = invalid
+
+    clean = raw[~quarantine]
+    cleared = 0
+    if clear:
+        clean = clean.copy()
+        for column, invalid in clear.items():
+            invalid = invalid[~quarantine]
+            cleared += int(invalid.sum())
+            clean.loc[invalid, column] = ''
+
+    quarantined = raw[quarantine].copy()
+    quarantined[REASON_COLUMN] = reasons[quarantine]
+    report.update({'clean_rows': len(clean), 'quarantined_rows': len(quarantined), 'cleared_values': cleared})
+    return clean, quarantined, report
+
+
+def read_feed_text(source_csv):
+    # Every value as the text in the file, so valid rows are written back unchanged
+    return pd.read_csv(source_csv, dtype=str, keep_default_na=False)
+
+
+@StageMetrics.instrument
+def validate_feed(source_csv, output_csv, quarantine_csv=None, strict=False):
+    # Validate source_csv, writing its valid rows to output_csv and the rest
+    # to quarantine_csv (default: next to output_csv). Returns the report
+    raw = read_feed_text(source_csv)
+    clean, quarantined, report = validate_frame(raw, strict)
+    StageMetrics.note(rows_in=len(raw), rows_out=len(clean))
+
+    os.makedirs(os.path.dirname(output_csv) or '.', exist_ok=True)
+    clean.to_csv(output_csv, index=False)
+    if quarantine_csv is None:
+        quarantine_csv = quarantine_path(output_csv)
+    if len(quarantined):
+        quarantined.to_csv(quarantine_csv, index=False)
+    elif os.path.exists(quarantine_csv):
+        os.remove(quarantine_csv)
+    report.update({'source': source_csv, 'output': output_csv, 'quarantine': quarantine_csv})
+    return report
+
+
+def quarantine_path(output_csv):
+    base, extension = os.path.splitext(output_csv)
+    return f"{base}.quarantine{extension or '.csv'}"
+
+
+def print_report(report):
+    print(f"{'column':<36} {'nulls':>7} {'invalid':>8}")
+    for column, counts in report['columns'].items():
+        if counts['nulls'] or counts['invalid']:
+            print(f"{column:<36} {counts['nulls']:>7} {counts['invalid']:>8}")
+    print(f"{report['rows']} rows: {report['clean_rows']} kept, {report['quarantined_rows']} quarantined, "
+          f"{report['cleared_values']} invalid values cleared")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Validate the pitch feed and quarantine rows that cannot be used')
+    parser.add_argument('--input', default='AnalyticsQuestionnairePitchData.csv')
+    parser.add_argument('--output', default=os.path.join('validated', 'AnalyticsQuestionnairePitchData.csv'),
+                        help='where to write the valid rows (default: %(default)s)')
+    parser.add_argument('--quarantine', help='where to write the rejected rows (default: next to --output)')
+    parser.add_argument('--strict', action='store_true',
+                        help='quarantine rows with any invalid value instead of clearing the value')
+    parser.add_argument('--report', help='also write the report to this JSON file')
+    StageMetrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.input):
+        print(f"{args.input} not found")
+        return
+
+    StageMetrics.start_from_args(args)
+    start = time.perf_counter()
+    try:
+        report = validate_feed(args.input, args.output, args.quarantine, args.strict)
+    except ValueError as e:
+        print(e)
+        raise SystemExit(1)
+    print_report(report)
+    print(f"Validated in {time.perf_counter() - start:.3f} s")
+    if report['quarantined_rows']:
+        print(f"Quarantined rows written to '{report['quarantine']}'")
+
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+    StageMetrics.finish_from_args(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,182 +1,301 @@
+import argparse
 import csv
 import os
-import pandas as pd
-import numpy as np
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import BuildManifest
+import LazyImport
+import PitchPhysics
+import PitchSchema
+import PitchStorage
+import StageMetrics
 
-def calculate_pitcher_stats(game_file, game_id):
+pd = LazyImport.lazy_module('pandas')
+np = LazyImport.lazy_module('numpy')
+
+# Pitch types reported in the per-game results, in column order
+PITCH_TYPES = ['FF', 'SI', 'FC', 'CU', 'CH', 'SL', 'KC']
+
+# Every PitchCall the results rules look at; anything else is coded -1
+PITCH_CALLS = [
+    'ball', 'called_strike', 'swinging_strike', 'foul_tip', 'foul', 'field_out', 'force_out',
+    'grounded_into_double_play', 'single', 'double', 'triple', 'home_run', 'strikeout', 'walk'
+]
+
+STRIKE_CALLS = [
+    'called_strike', 'swinging_strike', 'foul_tip', 'field_out', 'foul',
+    'single', 'double', 'triple', 'home_run', 'grounded_into_double_play'
+]
+
+# Counters credited to the pitcher for every row with a given PitchCall
+RESULT_COLUMNS = ['1B', '2B', '3B', 'HR', 'Strikeouts', 'Walks', 'OutsRecorded']
+RESULT_RULES = {
+    'single': {'1B': 1},
+    'double': {'2B': 1},
+    'triple': {'3B': 1},
+    'home_run': {'HR': 1},
+    'strikeout': {'Strikeouts': 1, 'OutsRecorded': 1},
+    'walk': {'Walks': 1},
+    'field_out': {'OutsRecorded': 1},
+    'force_out': {'OutsRecorded': 1},
+    'grounded_into_double_play': {'OutsRecorded': 2},
+}
+
+# Lookup tables indexed by PitchCall category code. The extra trailing row is
+# all zeros so that code -1 (unknown or missing call) indexes into it. Kept as
+# plain lists so importing this module does not import NumPy
+STRIKE_MASK = [call in STRIKE_CALLS for call in PITCH_CALLS] + [False]
+RESULT_TABLE = [[RESULT_RULES.get(call, {}).get(column, 0) for column in RESULT_COLUMNS] for call in PITCH_CALLS]
+RESULT_TABLE.append([0] * len(RESULT_COLUMNS))
+
+# Release spin, copied into the PitcherMovement files for pitch classification.
+# Read at float64 (not the schema's float32) so they are copied verbatim
+SPIN_COLUMNS = ['ReleaseSpinRate', 'ReleaseSpinAxis']
+
+# Columns read from a sorted game file; PitchSchema decides their types
+GAME_COLUMNS = [
+    'PitchId', 'PitcherId', 'PitcherHand', 'PitchCall', 'PitchType', 'BatterId', 'BatterSide', 'IsTop',
+    'PitchNumber', 'AtBatNumber', 'ReleaseSpeed', 'TrajectoryHorizontalBreak', 'TrajectoryVerticalBreakInduced',
+    'ReleasePositionX', 'ReleasePositionZ'
+] + SPIN_COLUMNS + PitchPhysics.PHYSICS_INPUT_COLUMNS
+
+PITCHER_RESULTS_HEADERS = [
+    'PitcherId', 'PitcherTeam', 'PitcherHand', 'OutsRecorded', 'InningsPitched', '1B', '2B', '3B', 'HR',
+    'Strikeouts', 'Walks', 'TotalBattersFaced', 'BAA', 'WHIP', 'TotalPitches', 'Strikes',
+    'StrikePercentage', 'FF', 'FF_K%', 'SI', 'SI_K%', 'FC', 'FC_K%', 'CU', 'CU_K%',
+    'CH', 'CH_K%', 'SL', 'SL_K%', 'KC', 'KC_K%'
+]
+
+PITCHER_METRICS_HEADERS = [
+    'PitchID', 'PitcherHand', 'PitchType', 'ReleaseSpeed', 'TrajectoryHorizontalBreak',
+    'TrajectoryVerticalBreakInduced', 'ReleasePositionX', 'ReleasePositionZ'
+] + list(PitchPhysics.PHYSICS_COLUMNS) + SPIN_COLUMNS + ['PitchNumber']
+
+# Strings pd.read_csv treats as missing by default
+CSV_NA_VALUES = [
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+    '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'
+]
+
+def game_frame_from_text(raw):
+    # Type the GAME_COLUMNS of a game held as unparsed csv text, the way
+    # load_game would have parsed them. Floats go through float(), which agrees
+    # with read_csv for the feed's values, so both paths produce the same outputs
+    columns = {}
+    for column in GAME_COLUMNS:
+        values = raw[column].where(~raw[column].isin(CSV_NA_VALUES))
+        if column in PitchSchema.CATEGORY_VOCABULARIES:
+            columns[column] = values
+        elif column in PitchSchema.INTEGER_COLUMNS:
+            columns[column] = pd.to_numeric(values)
+        else:
+            columns[column] = values.astype('float64')
+    return PitchSchema.apply_schema(pd.DataFrame(columns), SPIN_COLUMNS)
+
+class GameContext:
+    # One parse of a game file shared by every per-game output. Rows are stably
+    # reordered so each pitcher's pitches are contiguous (pitchers in order of
+    # first appearance), and offsets[i]:offsets[i + 1] bounds pitcher i's rows
+
+    def __init__(self, game_file, game_id, df=None):
+        self.game_file = game_file
+        self.game_id = game_id
+
+        if df is None:
+            df = PitchSchema.read_pitches(game_file, columns=GAME_COLUMNS, float64_columns=SPIN_COLUMNS)
+        df = df[df['PitcherId'].notna()]
+
+        codes, self.pitcher_ids = pd.factorize(df['PitcherId'])
+        order = np.argsort(codes, kind='stable')
+        self.df = df.take(order).reset_index(drop=True)
+        self.offsets = np.searchsorted(codes[order], np.arange(len(self.pitcher_ids) + 1))
+
+    def __len__(self):
+        return len(self.df)
+
+    def pitcher_rows(self, index):
+        # Zero-copy slice of one pitcher's rows
+        return self.df.iloc[self.offsets[index]:self.offsets[index + 1]]
+
+    def pitchers(self):
+        for index, pitcher_id in enumerate(self.pitcher_ids):
+            yield pitcher_id, self.pitcher_rows(index)
+
+def load_game(game_file, game_id):
+    return GameContext(game_file, game_id)
+
+def counted_pitches(df, group_keys, previous_numbers=None):
+    # Only count actual pitches: a row counts when its PitchNumber differs from
+    # the previous numbered row of its group (pickoffs and stolen bases repeat it).
+    # previous_numbers maps a group (single key) to the last PitchNumber it had
+    # in the rows before df, when a game is read in chunks
+    pitch_number = df['PitchNumber']
+    numbered = pitch_number.notna().to_numpy()
+    numbered_rows = pitch_number[numbered]
+    previous_number = numbered_rows.groupby([k[numbered] for k in group_keys], sort=False).shift()
+    if previous_numbers:
+        carried = group_keys[0][numbered].map(previous_numbers).astype('float64')
+        previous_number = previous_number.astype('float64').fillna(carried)
+    counted = np.zeros(len(df), dtype=bool)
+    counted[numbered] = (numbered_rows != previous_number).fillna(True).to_numpy(dtype=bool)
+    return counted
+
+def calculate_pitcher_counts(df, keys=('PitcherId',), previous_numbers=None):
+    # Columnar pass over every pitch: one row of additive counters per pitcher
+    # (or per group of keys, e.g. ('GamePk', 'PitcherId') for a whole season),
+    # in order of first appearance
+    keys = list(keys)
+    df = df.dropna(subset=keys)
+    group_keys = [df[k] for k in keys]
+
+    call_codes = pd.Index(PITCH_CALLS).get_indexer(df['PitchCall'])
+    type_codes = pd.Index(PITCH_TYPES).get_indexer(df['PitchType'])
+
+    counted = counted_pitches(df, group_keys, previous_numbers)
+    strike = counted & np.asarray(STRIKE_MASK)[call_codes]
+
+    columns = {'TotalPitches': counted, 'Strikes': strike}
+    for column, values in zip(RESULT_COLUMNS, np.asarray(RESULT_TABLE, dtype=np.int64)[call_codes].T):
+        columns[column] = values
+    for code, pitch_type in enumerate(PITCH_TYPES):
+        is_type = type_codes == code
+        columns[pitch_type] = counted & is_type
+        columns[f"{pitch_type}_Strikes"] = strike & is_type
+
+    grouped = df.groupby(group_keys, sort=False)
+    counts = pd.DataFrame(columns, index=df.index).groupby(group_keys, sort=False).sum()
+    counts['TotalBattersFaced'] = grouped['AtBatNumber'].nunique(dropna=False)
+
+    first_rows = grouped[['IsTop', 'PitcherHand']].nth(0)
+    first_rows.index = counts.index
+    counts['PitcherTeam'] = np.where(first_rows['IsTop'].eq(1).fillna(False).to_numpy(dtype=bool), 1, 2)
+    counts['PitcherHand'] = first_rows['PitcherHand']
+    return counts
+
+def derive_pitcher_stats(pitcher_id, counts):
+    # Turn one pitcher's counters into the PitcherResults row
+    outs_recorded = int(counts['OutsRecorded'])
+    hits_1b = int(counts['1B'])
+    hits_2b = int(counts['2B'])
+    hits_3b = int(counts['3B'])
+    hits_hr = int(counts['HR'])
+    walks = int(counts['Walks'])
+    total_batters_faced = int(counts['TotalBattersFaced'])
+    total_pitches = int(counts['TotalPitches'])
+    strikes = int(counts['Strikes'])
+
+    innings_pitched = round(outs_recorded / 3.0, 2)
+    total_hits = hits_1b + hits_2b + hits_3b + hits_hr
+    baa = total_hits / total_batters_faced if total_batters_faced > 0 else 0
+    whip = (total_hits + walks) / innings_pitched if innings_pitched > 0 else 0
+    strike_percentage = strikes / total_pitches if total_pitches > 0 else 0
+
+    stats = {
+        'PitcherId': pitcher_id,
+        'PitcherHand': counts['PitcherHand'],
+        'OutsRecorded': outs_recorded,
+        'InningsPitched': round(innings_pitched, 2),
+        '1B': hits_1b,
+        '2B': hits_2b,
+        '3B': hits_3b,
+        'HR': hits_hr,
+        'Strikeouts': int(counts['Strikeouts']),
+        'Walks': walks,
+        'TotalBattersFaced': total_batters_faced,
+        'BAA': round(baa, 3),
+        'WHIP': round(whip, 3),
+        'TotalPitches': total_pitches,
+        'Strikes': strikes,
+        'StrikePercentage': round(strike_percentage, 3),
+    }
+
+    # Home/away only exists for a single game's counts, not season totals
+    if 'PitcherTeam' in counts:
+        stats['PitcherTeam'] = int(counts['PitcherTeam'])
+
+    # Strike percentage for each pitch type
+    for pitch_type in PITCH_TYPES:
+        type_count = int(counts[pitch_type])
+        type_strikes = int(counts[f"{pitch_type}_Strikes"])
+        stats[pitch_type] = type_count
+        stats[f"{pitch_type}_K%"] = round((type_strikes / type_count) * 100, 1) if type_count > 0 else 0
+
+    return stats
+
+@StageMetrics.instrument
+def calculate_pitcher_stats(game_file, game_id, game=None):
+
+    if game is None:
+        game = load_game(game_file, game_id)
+
+    counts = calculate_pitcher_counts(game.df)
 
-    df = pd.read_csv(game_file)
-    
-    # Group by pitcher to calculate individual stats
     pitcher_stats = {}
-    
-    for pitcher_id in df['PitcherId'].unique():
-        if pd.isna(pitcher_id):
-            continue
-            
-        pitcher_data = df[df['PitcherId'] == pitcher_id]
-
-        pitcher_team = 1 if pitcher_data['IsTop'].iloc[0] == 1 else 2
-        pitcher_hand = pitcher_data['PitcherHand'].iloc[0] if not pitcher_data['PitcherHand'].empty else 'Unknown'
-        outs_recorded = 0
-        hits_1b = 0
-        hits_2b = 0
-        hits_3b = 0
-        hits_hr = 0
-        strikeouts = 0
-        walks = 0
-        total_batters_faced = len(pitcher_data['AtBatNumber'].unique())
-        total_pitches = 0
-        strikes = 0
-        last_pitch_number = None
-        
-        # Count pitches by type
-        pitch_type_counts = defaultdict(int)
-        pitch_type_strikes = defaultdict(int)
-        
-        # Process each pitch
-        for _, pitch in pitcher_data.iterrows():
-            pitch_call = pitch['PitchCall']
-            pitch_type = pitch['PitchType']
-            pitch_number = pitch['PitchNumber']
-            
-            # Only count actual pitches (exclude pickoffs, stolen bases)
-            if pd.notna(pitch_number) and pitch_number != last_pitch_number:
-                total_pitches += 1
-                last_pitch_number = pitch_number
-                
-                # Count strikes
-                if pitch_call in ['called_strike', 'swinging_strike', 'foul_tip', 'field_out', 'foul', 'single', 'double', 'triple', 'home_run', 'grounded_into_double_play']:
-                    strikes += 1
-                    if pd.notna(pitch_type):
-                        pitch_type_strikes[pitch_type] += 1
-                
-                # Count pitch types
-                if pd.notna(pitch_type):
-                    pitch_type_counts[pitch_type] += 1
-            
-
-            # Count results
-            if pitch_call in ['single']:
-                hits_1b += 1
-            elif pitch_call in ['double']:
-                hits_2b += 1
-            elif pitch_call in ['triple']:
-                hits_3b += 1
-            elif pitch_call in ['home_run']:
-                hits_hr += 1
-            
-            if pitch_call == 'strikeout':
-                strikeouts += 1
-                outs_recorded += 1
-            elif pitch_call == 'walk':
-                walks += 1
-            elif pitch_call == 'field_out':
-                outs_recorded += 1
-            elif pitch_call == 'force_out':
-                outs_recorded += 1
-            elif pitch_call == 'grounded_into_double_play':
-                outs_recorded += 2
-            
-
-            innings_pitched = round(outs_recorded / 3.0, 2)
-        
-        # Calculate derived stats
-        total_hits = hits_1b + hits_2b + hits_3b + hits_hr
-        baa = total_hits / total_batters_faced if total_batters_faced > 0 else 0
-        whip = (total_hits + walks) / innings_pitched if innings_pitched > 0 else 0
-        strike_percentage = strikes / total_pitches if total_pitches > 0 else 0
-        
-        # Calculate strikeout percentages for each pitch type
-        pitch_type_k_percentages = {}
-        for pitch_type in pitch_type_counts:
-            if pitch_type_counts[pitch_type] > 0:
-                pitch_type_k_percentages[f"{pitch_type}_K%"] = (pitch_type_strikes[pitch_type] / pitch_type_counts[pitch_type]) * 100
-            else:
-                pitch_type_k_percentages[f"{pitch_type}_K%"] = 0
-        
-        # Store pitcher stats
-        pitcher_stats[pitcher_id] = {
-            'PitcherId': pitcher_id,
-            'PitcherTeam': pitcher_team,
-            'PitcherHand': pitcher_hand,
-            'OutsRecorded': outs_recorded,
-            'InningsPitched': round(innings_pitched, 2),
-            '1B': hits_1b,
-            '2B': hits_2b,
-            '3B': hits_3b,
-            'HR': hits_hr,
-            'Strikeouts': strikeouts,
-            'Walks': walks,
-            'TotalBattersFaced': total_batters_faced,
-            'BAA': round(baa, 3),
-            'WHIP': round(whip, 3),
-            'TotalPitches': total_pitches,
-            'Strikes': strikes,
-            'StrikePercentage': round(strike_percentage, 3),
-            'FF': pitch_type_counts.get('FF', 0),
-            'FF_K%': round(pitch_type_k_percentages.get('FF_K%', 0), 1),
-            'SI': pitch_type_counts.get('SI', 0),
-            'SI_K%': round(pitch_type_k_percentages.get('SI_K%', 0), 1),
-            'FC': pitch_type_counts.get('FC', 0),
-            'FC_K%': round(pitch_type_k_percentages.get('FC_K%', 0), 1),
-            'CU': pitch_type_counts.get('CU', 0),
-            'CU_K%': round(pitch_type_k_percentages.get('CU_K%', 0), 1),
-            'CH': pitch_type_counts.get('CH', 0),
-            'CH_K%': round(pitch_type_k_percentages.get('CH_K%', 0), 1),
-            'SL': pitch_type_counts.get('SL', 0),
-            'SL_K%': round(pitch_type_k_percentages.get('SL_K%', 0), 1),
-            'KC': pitch_type_counts.get('KC', 0),
-            'KC_K%': round(pitch_type_k_percentages.get('KC_K%', 0), 1)
-        }
-    
+    for pitcher_id, pitcher_counts in zip(counts.index, counts.to_dict('records')):
+        pitcher_stats[pitcher_id] = derive_pitcher_stats(pitcher_id, pitcher_counts)
+
+    StageMetrics.note(game=game_id, rows_in=len(game), rows_out=len(pitcher_stats))
     return pitcher_stats
 
-def calculate_pitcher_movement(game_file, game_id):
-    # Read the CSV file
-    df = pd.read_csv(game_file)
-    
-    # Get all unique pitcher IDs
-    pitcher_ids = df['PitcherId'].unique()
-    
+@StageMetrics.instrument
+def calculate_pitcher_movement(game_file, game_id, game=None, fmt='csv', append_pitchers=()):
+    # append_pitchers: pitchers whose movement file already holds the rows of an
+    # earlier chunk of this game, so this game's rows are added to it
+
+    if game is None:
+        game = load_game(game_file, game_id)
+
+    pitcher_data = None
+
+    StageMetrics.note(game=game_id, rows_in=len(game), rows_out=len(game), pitchers=len(game.pitcher_ids))
+
+    # Derived physics for the whole game in one vectorized pass, sliced per pitcher
+    physics = PitchPhysics.derive_pitch_physics(game.df)
+
     # For each pitcher, call the CSV generator
-    for pitcher_id in pitcher_ids:
-        if pd.isna(pitcher_id):
-            continue
-        
+    for index, (pitcher_id, rows) in enumerate(game.pitchers()):
+
         # Create pitcher-specific data dictionary
         pitcher_data = {
-            'PitchID': df[df['PitcherId'] == pitcher_id]['PitchId'].tolist(),
-            'PitcherHand': df[df['PitcherId'] == pitcher_id]['PitcherHand'].iloc[0],
-            'PitchType': df[df['PitcherId'] == pitcher_id]['PitchType'].tolist(),
-            'ReleaseSpeed': df[df['PitcherId'] == pitcher_id]['ReleaseSpeed'].tolist(),
-            'TrajectoryHorizontalBreak': df[df['PitcherId'] == pitcher_id]['TrajectoryHorizontalBreak'].tolist(),
-            'TrajectoryVerticalBreakInduced': df[df['PitcherId'] == pitcher_id]['TrajectoryVerticalBreakInduced'].tolist(),
-            'ReleasePositionX': df[df['PitcherId'] == pitcher_id]['ReleasePositionX'].tolist(),
-            'ReleasePositionZ': df[df['PitcherId'] == pitcher_id]['ReleasePositionZ'].tolist()
+            'PitchID': rows['PitchId'].tolist(),
+            'PitcherHand': rows['PitcherHand'].iloc[0],
+            'PitchType': rows['PitchType'].tolist(),
+            'ReleaseSpeed': rows['ReleaseSpeed'].tolist(),
+            'TrajectoryHorizontalBreak': rows['TrajectoryHorizontalBreak'].tolist(),
+            'TrajectoryVerticalBreakInduced': rows['TrajectoryVerticalBreakInduced'].tolist(),
+            'ReleasePositionX': rows['ReleasePositionX'].tolist(),
+            'ReleasePositionZ': rows['ReleasePositionZ'].tolist()
         }
-        
+        pitcher_physics = physics.iloc[game.offsets[index]:game.offsets[index + 1]]
+        for column in PitchPhysics.PHYSICS_COLUMNS:
+            pitcher_data[column] = pitcher_physics[column].tolist()
+        for column in SPIN_COLUMNS:
+            pitcher_data[column] = rows[column].tolist()
+        # Kept so readers of the movement file can tell pitches from the
+        # pickoff and stolen base rows that repeat a PitchNumber
+        pitcher_data['PitchNumber'] = [None if pd.isna(number) else int(number) for number in rows['PitchNumber']]
+
         # Call the CSV generator for this pitcher
-        create_pitcher_metrics_csv(game_file, game_id, pitcher_id, pitcher_data)
-    
+        create_pitcher_metrics_csv(game_file, game_id, pitcher_id, pitcher_data, fmt=fmt,
+                                   append=pitcher_id in append_pitchers)
+
     return pitcher_data
 
-def create_pitcher_results_csv(game_file, game_id, output_dir='PitcherGameResults'):
+def create_pitcher_results_csv(game_file, game_id, output_dir='PitcherGameResults', game=None, fmt='csv', pitcher_stats=None):
 
     os.makedirs(output_dir, exist_ok=True)
     
-    pitcher_stats = calculate_pitcher_stats(game_file, game_id)
+    if pitcher_stats is None:
+        pitcher_stats = calculate_pitcher_stats(game_file, game_id, game)
     
-    headers = [
-        'PitcherId', 'PitcherTeam', 'PitcherHand', 'OutsRecorded', 'InningsPitched', '1B', '2B', '3B', 'HR',
-        'Strikeouts', 'Walks', 'TotalBattersFaced', 'BAA', 'WHIP', 'TotalPitches', 'Strikes',
-        'StrikePercentage', 'FF', 'FF_K%', 'SI', 'SI_K%', 'FC', 'FC_K%', 'CU', 'CU_K%',
-        'CH', 'CH_K%', 'SL', 'SL_K%', 'KC', 'KC_K%'
-    ]
+    headers = PITCHER_RESULTS_HEADERS
     
-    output_filename = f"PitcherResultsGame{game_id}.csv"
-    output_path = os.path.join(output_dir, output_filename)
+    base_path = os.path.join(output_dir, f"PitcherResultsGame{game_id}")
+
+    # Binary formats go through the storage layer; CSV keeps its exact text format
+    if PitchStorage.resolve_format(fmt) != 'csv':
+        return PitchStorage.write_table(pd.DataFrame(list(pitcher_stats.values()), columns=headers), base_path, fmt)
+
+    output_path = PitchStorage.table_path(base_path, 'csv')
     
     with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=headers)
@@ -187,21 +306,32 @@ def create_pitcher_results_csv(game_file, game_id, output_dir='PitcherGameResult
     
     return output_path
 
-def create_pitcher_metrics_csv(game_file, game_id, pitcher_id, pitcher_data, output_dir='PitcherMovement'):
+def pitcher_metrics_path(game_id, pitcher_id, output_dir='PitcherMovement', fmt='csv'):
+    return PitchStorage.table_path(os.path.join(output_dir, f"Pitcher{pitcher_id}MetricsGame{game_id}"), fmt)
+
+@StageMetrics.instrument
+def create_pitcher_metrics_csv(game_file, game_id, pitcher_id, pitcher_data, output_dir='PitcherMovement', fmt='csv',
+                               append=False):
     
     os.makedirs(output_dir, exist_ok=True)
+    StageMetrics.note(game=game_id, pitcher=pitcher_id, rows_out=len(pitcher_data['PitchID']))
 
-    headers = [
-        'PitchID', 'PitcherHand', 'PitchType', 'ReleaseSpeed', 'TrajectoryHorizontalBreak', 
-        'TrajectoryVerticalBreakInduced', 'ReleasePositionX', 'ReleasePositionZ'
-    ]
+    headers = PITCHER_METRICS_HEADERS
 
-    output_filename = f"Pitcher{pitcher_id}MetricsGame{game_id}.csv"
-    output_path = os.path.join(output_dir, output_filename)
+    if PitchStorage.resolve_format(fmt) != 'csv':
+        if append:
+            raise ValueError(f"Appending to a {fmt} movement table is not supported; use csv")
+        columns = dict(pitcher_data)
+        columns['PitcherHand'] = [pitcher_data['PitcherHand']] * len(pitcher_data['PitchID'])
+        base_path = os.path.join(output_dir, f"Pitcher{pitcher_id}MetricsGame{game_id}")
+        return PitchStorage.write_table(pd.DataFrame(columns, columns=headers), base_path, fmt)
 
-    with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
+    output_path = pitcher_metrics_path(game_id, pitcher_id, output_dir)
+
+    with open(output_path, 'a' if append else 'w', newline='', encoding='utf-8') as csvfile:
         writer = csv.DictWriter(csvfile, fieldnames=headers)
-        writer.writeheader()
+        if not append:
+            writer.writeheader()
 
         # Write each pitch as a row
         for i in range(len(pitcher_data['PitchID'])):
@@ -215,37 +345,224 @@ def create_pitcher_metrics_csv(game_file, game_id, pitcher_id, pitcher_data, out
                 'ReleasePositionX': pitcher_data['ReleasePositionX'][i],
                 'ReleasePositionZ': pitcher_data['ReleasePositionZ'][i]
             }
+            for column in list(PitchPhysics.PHYSICS_COLUMNS) + SPIN_COLUMNS + ['PitchNumber']:
+                row[column] = pitcher_data[column][i]
             writer.writerow(row)
 
     return output_path
 
 
-def process_all_games(games_dir='gamesSorted'):
+# Additive counters of calculate_pitcher_counts besides the results columns
+PARTIAL_COUNT_COLUMNS = (['TotalPitches', 'Strikes'] + PITCH_TYPES
+                         + [f"{pitch_type}_Strikes" for pitch_type in PITCH_TYPES])
+
+class PitcherPartials:
+    # Per-pitcher state of a game read in chunks: everything needed to finish
+    # the results of the pitchers seen so far, and nothing per pitch. Counters
+    # add across chunks; batters faced is the size of each pitcher's set of
+    # at-bats, and a pitch counts against the last PitchNumber of the previous
+    # chunk, so the totals equal those of the whole game parsed at once
+
+    def __init__(self):
+        self.totals = {}
+        self.labels = {}
+        self.at_bats = {}
+        self.last_pitch_numbers = {}
+
+    def add(self, df):
+        counts = calculate_pitcher_counts(df, previous_numbers=self.last_pitch_numbers)
+        for pitcher_id, row in zip(counts.index, counts.to_dict('records')):
+            if pitcher_id not in self.totals:
+                self.totals[pitcher_id] = dict.fromkeys(RESULT_COLUMNS + PARTIAL_COUNT_COLUMNS, 0)
+                self.labels[pitcher_id] = {'PitcherTeam': row['PitcherTeam'], 'PitcherHand': row['PitcherHand']}
+                self.at_bats[pitcher_id] = set()
+            totals = self.totals[pitcher_id]
+            for column in totals:
+                totals[column] += int(row[column])
+
+        for pitcher_id, at_bats in df.groupby('PitcherId', sort=False)['AtBatNumber'].unique().items():
+            self.at_bats[pitcher_id].update(at_bats.tolist())
+
+        numbered = df[df['PitchNumber'].notna()]
+        self.last_pitch_numbers.update(numbered.groupby('PitcherId', sort=False)['PitchNumber'].last().to_dict())
+
+    def pitcher_stats(self):
+        pitcher_stats = {}
+        for pitcher_id, totals in self.totals.items():
+            counts = dict(totals, TotalBattersFaced=len(self.at_bats[pitcher_id]), **self.labels[pitcher_id])
+            pitcher_stats[pitcher_id] = derive_pitcher_stats(pitcher_id, counts)
+        return pitcher_stats
+
+def process_game_chunked(games_dir, filename, chunk_size, fmt='csv'):
+    # process_game for a game file read chunk_size rows at a time: memory holds
+    # one chunk plus the per-pitcher partials, and the outputs are identical
+    errors = []
+    outputs = []
+    game_id = PitchStorage.strip_extension(filename).replace('game_', '')
+    game_file = os.path.join(games_dir, filename)
+
+    partials = PitcherPartials()
+    written = set()
+    try:
+        for chunk in PitchSchema.read_pitch_chunks(game_file, chunk_size, columns=GAME_COLUMNS,
+                                                   float64_columns=SPIN_COLUMNS):
+            game = GameContext(game_file, game_id, chunk)
+            partials.add(game.df)
+            calculate_pitcher_movement(game_file, game_id, game, fmt, append_pitchers=written)
+            written.update(game.pitcher_ids)
+    except Exception as e:
+        errors.append(f"Error processing {filename}: {str(e)}")
+        return errors, outputs
+
+    try:
+        outputs.append(create_pitcher_results_csv(game_file, game_id, fmt=fmt, pitcher_stats=partials.pitcher_stats()))
+    except Exception as e:
+        errors.append(f"Error processing {filename}: {str(e)}")
+
+    outputs.extend(pitcher_metrics_path(game_id, pitcher_id, fmt=fmt) for pitcher_id in partials.totals)
+    return errors, outputs
+
+@StageMetrics.instrument
+def process_game(games_dir, filename, fmt='csv', hitters=False, chunk_size=None):
+    # Build every output for one game file. Returns (errors, output paths);
+    # failures are returned as messages rather than raised so one bad game
+    # never stops the rest of the batch (the metrics log still records them).
+    # With hitters, the hitter results are built from the same parse. With
+    # chunk_size, the game is read in chunks (see process_game_chunked)
+    StageMetrics.note(game=PitchStorage.strip_extension(filename).replace('game_', ''))
+    if chunk_size:
+        errors, outputs = process_game_chunked(games_dir, filename, chunk_size, fmt)
+    else:
+        errors, outputs = process_game_in_memory(games_dir, filename, fmt, hitters)
+
+    StageMetrics.note(outputs=len(outputs))
+    if errors:
+        StageMetrics.note(error='; '.join(errors))
+    return errors, outputs
+
+def process_game_in_memory(games_dir, filename, fmt='csv', hitters=False):
+    errors = []
+    outputs = []
+
+    # Extract game ID from filename (e.g., 'game_1.csv' -> '1')
+    game_id = PitchStorage.strip_extension(filename).replace('game_', '')
+
+    game_file = os.path.join(games_dir, filename)
+
+    # Parse once and share the context with both outputs
+    try:
+        game = load_game(game_file, game_id)
+    except Exception as e:
+        errors.append(f"Error processing {filename}: {str(e)}")
+        return errors, outputs
+
+    try:
+        outputs.append(create_pitcher_results_csv(game_file, game_id, game=game, fmt=fmt))
+    except Exception as e:
+        errors.append(f"Error processing {filename}: {str(e)}")
+
+    try:
+        calculate_pitcher_movement(game_file, game_id, game, fmt)
+        outputs.extend(pitcher_metrics_path(game_id, pitcher_id, fmt=fmt) for pitcher_id in game.pitcher_ids)
+    except Exception as e:
+        errors.append(f"Error processing pitcher movement data for {filename}: {str(e)}")
+
+    if hitters:
+        # Imported here because HitterResultsGenerator builds on this module
+        import HitterResultsGenerator
+        try:
+            outputs.append(HitterResultsGenerator.create_hitter_results_csv(game_file, game_id, game=game, fmt=fmt))
+        except Exception as e:
+            errors.append(f"Error processing hitter results for {filename}: {str(e)}")
+
+    return errors, outputs
+
+def process_all_games(games_dir='gamesSorted', workers=1, manifest=None, fmt='csv', hitters=False, chunk_size=None):
 
     if not os.path.exists(games_dir):
         print(f"Directory {games_dir} does not exist")
         return
     
-    # Process each game file
-    for filename in os.listdir(games_dir):
-        if filename.endswith('.csv'):
-            # Extract game ID from filename (e.g., 'game_1.csv' -> '1')
-            game_id = filename.replace('game_', '').replace('.csv', '')
-            
+    filenames = PitchStorage.list_tables(games_dir)
+
+    # Every game comes from the same feed, so a missing column would fail each
+    # one alike; report it once. Imported here because PitchValidation builds
+    # on this module
+    if filenames:
+        import PitchValidation
+        missing = PitchValidation.missing_columns(PitchValidation.table_columns(os.path.join(games_dir, filenames[0])))
+        if missing:
+            print(f"Game files in {games_dir} are missing required columns: {', '.join(missing)}")
+            return
+
+    # With a build manifest, skip games whose file and generator code are unchanged
+    input_digests = {}
+    if manifest is not None:
+        stage_files = [__file__, PitchStorage.__file__, PitchSchema.__file__, PitchPhysics.__file__]
+        if hitters:
+            stage_files.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'HitterResultsGenerator.py'))
+        stage_version = BuildManifest.code_version(*stage_files)
+        stale = []
+        for filename in filenames:
             game_file = os.path.join(games_dir, filename)
-            
-            try:
-                create_pitcher_results_csv(game_file, game_id)
-            except Exception as e:
-                print(f"Error processing {filename}: {str(e)}")
+            input_digests[filename] = BuildManifest.text_digest(stage_version, fmt, BuildManifest.file_digest(game_file))
+            if not BuildManifest.is_fresh(manifest, 'results', game_file, input_digests[filename]):
+                stale.append(filename)
+        filenames = stale
+
+    def finish(filename, errors, outputs):
+        for error in errors:
+            print(error)
+        if manifest is not None and not errors:
+            BuildManifest.record(manifest, 'results', os.path.join(games_dir, filename),
+                                 input_digests[filename], outputs)
 
-            try: 
-                calculate_pitcher_movement(game_file, game_id)
+    # Process each game file
+    if workers <= 1:
+        for filename in filenames:
+            finish(filename, *process_game(games_dir, filename, fmt, hitters, chunk_size))
+        return
+
+    # Games share no state, so each one is an independent task
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_game, games_dir, filename, fmt, hitters, chunk_size): filename for filename in filenames}
+        for future in as_completed(futures):
+            filename = futures[future]
+            try:
+                errors, outputs = future.result()
             except Exception as e:
-                print(f"Error processing pitcher movement data")
+                # The worker itself died (or the task could not be sent to it)
+                errors, outputs = [f"Error processing {filename}: {str(e)}"], []
+            finish(filename, errors, outputs)
 
 def main():
-    process_all_games()
+    parser = argparse.ArgumentParser(description='Generate per-game pitcher results and movement files')
+    parser.add_argument('--games-dir', default='gamesSorted')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='number of worker processes (default: %(default)s)')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only reprocess games whose sorted file changed since the last run')
+    parser.add_argument('--format', choices=PitchStorage.FORMATS, default='csv',
+                        help='storage format for the results and movement tables (default: %(default)s)')
+    parser.add_argument('--hitters', action='store_true',
+                        help='also write HitterGameResults from the same parse of each game')
+    parser.add_argument('--chunk-size', type=int,
+                        help='read each game file this many rows at a time, for games larger than memory')
+    StageMetrics.add_arguments(parser)
+    args = parser.parse_args()
+
+    if args.chunk_size is not None:
+        if args.chunk_size <= 0:
+            parser.error('--chunk-size must be positive')
+        if args.hitters or PitchStorage.resolve_format(args.format) != 'csv':
+            parser.error('--chunk-size writes csv pitcher outputs only (no --hitters or binary --format)')
+
+    StageMetrics.start_from_args(args)
+    manifest = BuildManifest.load_manifest() if args.incremental else None
+    process_all_games(args.games_dir, args.workers, manifest, args.format, args.hitters, args.chunk_size)
+    if manifest is not None:
+        BuildManifest.save_manifest(manifest)
+    StageMetrics.finish_from_args(args)
 
 if __name__ == "__main__":
     main()
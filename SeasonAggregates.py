@@ -0,0 +1,325 @@
+import argparse
+import csv
+import json
+import os
+
+import BuildManifest
+import HitterResultsGenerator
+import PitchStorage
+import PitcherResultsGenerator
+from PitcherResultsGenerator import PITCH_TYPES, RESULT_COLUMNS
+
+# Season totals per player, kept as additive counters so that adding a game is
+# a merge over that game's players only. Rate stats (IP, BAA, WHIP, AVG, strike
+# and whiff percentages) are derived from the counters when read, never stored.
+# Each game's contribution is kept too, so re-merging a changed game replaces
+# its old counts instead of double counting them. Adding a game reads and
+# writes only that game's and its players' files (see new_season); the season
+# CSV, which lists every player, is only written on request
+SEASON_VERSION = 3
+
+# Counters summed across games (the inputs of derive_pitcher_stats)
+COUNT_COLUMNS = (
+    RESULT_COLUMNS + ['TotalBattersFaced', 'TotalPitches', 'Strikes']
+    + PITCH_TYPES + [f"{pitch_type}_Strikes" for pitch_type in PITCH_TYPES]
+)
+
+# Season rows: the per-game results columns, with the number of games in place
+# of PitcherTeam (which only means home/away within a single game)
+PITCHER_SEASON_HEADERS = ['PitcherId', 'PitcherHand', 'Games'] + [
+    h for h in PitcherResultsGenerator.PITCHER_RESULTS_HEADERS if h not in ('PitcherId', 'PitcherTeam', 'PitcherHand')
+]
+
+HITTER_SEASON_HEADERS = ['BatterId', 'BatterSide', 'Games'] + [
+    h for h in HitterResultsGenerator.HITTER_RESULTS_HEADERS if h not in ('BatterId', 'BatterSide')
+]
+
+# What a season store aggregates: the per-game counter function, the additive
+# columns it produces, the per-player label kept from the latest game, and how
+# to derive a results row from the totals
+SEASON_KINDS = {
+    'pitchers': {
+        'path': os.path.join('PitcherSeasonResults', 'season_store'),
+        'csv_path': os.path.join('PitcherSeasonResults', 'PitcherSeasonResults.csv'),
+        'counts': PitcherResultsGenerator.calculate_pitcher_counts,
+        'count_columns': COUNT_COLUMNS,
+        'label': 'PitcherHand',
+        'derive': PitcherResultsGenerator.derive_pitcher_stats,
+        'headers': PITCHER_SEASON_HEADERS,
+    },
+    'hitters': {
+        'path': os.path.join('HitterSeasonResults', 'season_store'),
+        'csv_path': os.path.join('HitterSeasonResults', 'HitterSeasonResults.csv'),
+        'counts': HitterResultsGenerator.calculate_hitter_counts,
+        'count_columns': HitterResultsGenerator.HITTER_COUNT_COLUMNS,
+        'label': 'BatterSide',
+        'derive': HitterResultsGenerator.derive_hitter_stats,
+        'headers': HITTER_SEASON_HEADERS,
+    },
+}
+
+
+def store_dir(kind):
+    return SEASON_KINDS[kind]['path']
+
+
+def new_season(kind='pitchers', path=None):
+    # A season store is a directory, so that merging a game only writes what the
+    # game touched:
+    #   games/<game_id>.json     one game's per-player counters
+    #   players/<player_id>.json one player's running totals
+    #   sources.jsonl            append-only log of each merged game's source file
+    # Entries are read from disk on first use and the changed ones are written
+    # back by save_season
+    return {'version': SEASON_VERSION, 'kind': kind, 'path': path or store_dir(kind), 'sources': {},
+            'games': {}, 'players': {}, 'dirty_games': set(), 'dirty_players': set()}
+
+
+def _read_json(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_json(path, data):
+    # Write to a temporary file and rename it, so a crash never leaves half a file
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _entry_path(season, folder, key):
+    return os.path.join(season['path'], folder, f"{key}.json")
+
+
+def load_season(kind='pitchers', path=None):
+    # Only the store's meta data and source log are read here: O(games) small
+    # lines, no per-player or per-game counters
+    season = new_season(kind, path)
+    try:
+        meta = _read_json(os.path.join(season['path'], 'meta.json'))
+    except (OSError, ValueError) as e:
+        print(f"Ignoring unreadable season aggregates {season['path']}: {e}")
+        meta = None
+    if not meta or meta.get('version') != SEASON_VERSION or meta.get('kind') != kind:
+        if meta is not None:
+            print(f"Ignoring season aggregates in {season['path']} from another version; rebuilding")
+        clear_season(season)
+        return season
+
+    try:
+        with open(os.path.join(season['path'], 'sources.jsonl'), 'r') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    season['sources'][record['game']] = record['source']
+    except FileNotFoundError:
+        pass
+    return season
+
+
+def clear_season(season):
+    # Forget every stored game and player
+    for folder in ('games', 'players'):
+        directory = os.path.join(season['path'], folder)
+        if os.path.isdir(directory):
+            for filename in os.listdir(directory):
+                os.remove(os.path.join(directory, filename))
+    sources_path = os.path.join(season['path'], 'sources.jsonl')
+    if os.path.exists(sources_path):
+        os.remove(sources_path)
+    season.update({'sources': {}, 'games': {}, 'players': {}, 'dirty_games': set(), 'dirty_players': set()})
+
+
+def save_season(season):
+    # Write the games and players changed since the store was loaded, then log
+    # the merged games' sources. O(players in the merged games)
+    _write_json(os.path.join(season['path'], 'meta.json'), {'version': SEASON_VERSION, 'kind': season['kind']})
+    for folder, dirty, entries in (('games', season['dirty_games'], season['games']),
+                                   ('players', season['dirty_players'], season['players'])):
+        for key in dirty:
+            path = _entry_path(season, folder, key)
+            if entries[key] is None:
+                if os.path.exists(path):
+                    os.remove(path)
+            else:
+                _write_json(path, entries[key])
+
+    if season['dirty_games']:
+        with open(os.path.join(season['path'], 'sources.jsonl'), 'a') as f:
+            for game_id in sorted(season['dirty_games']):
+                f.write(json.dumps({'game': game_id, 'source': season['sources'].get(game_id)}) + '\n')
+    season['dirty_games'] = set()
+    season['dirty_players'] = set()
+
+
+def game_entry(season, game_id):
+    # One stored game's {'players': contribution}, or None
+    game_id = str(game_id)
+    if game_id not in season['games']:
+        season['games'][game_id] = _read_json(_entry_path(season, 'games', game_id))
+    return season['games'][game_id]
+
+
+def player_totals(season, player_id):
+    # One player's running totals, or None
+    player_id = str(player_id)
+    if player_id not in season['players']:
+        season['players'][player_id] = _read_json(_entry_path(season, 'players', player_id))
+    return season['players'][player_id]
+
+
+def player_ids(season):
+    # Every player with season totals. Lists the store: O(players), for export
+    directory = os.path.join(season['path'], 'players')
+    stored = {filename[:-len('.json')] for filename in os.listdir(directory)} if os.path.isdir(directory) else set()
+    stored |= {player_id for player_id, totals in season['players'].items() if totals is not None}
+    return sorted((player_id for player_id in stored if player_totals(season, player_id) is not None), key=int)
+
+
+def game_contribution(season, counts):
+    # Per-player counters of one game, from the kind's counter function
+    spec = SEASON_KINDS[season['kind']]
+    contribution = {}
+    for player_id, row in zip(counts.index, counts.to_dict('records')):
+        player = {column: int(row[column]) for column in spec['count_columns']}
+        player[spec['label']] = row[spec['label']] if isinstance(row[spec['label']], str) else None
+        contribution[str(int(player_id))] = player
+    return contribution
+
+
+def _apply(season, contribution, sign):
+    spec = SEASON_KINDS[season['kind']]
+    for player_id, game_counts in contribution.items():
+        totals = player_totals(season, player_id) or {'Games': 0, spec['label']: None,
+                                                      **{column: 0 for column in spec['count_columns']}}
+        totals['Games'] += sign
+        for column in spec['count_columns']:
+            totals[column] += sign * game_counts[column]
+        if sign > 0 and game_counts[spec['label']] is not None:
+            totals[spec['label']] = game_counts[spec['label']]
+        season['players'][player_id] = totals if totals['Games'] != 0 else None
+        season['dirty_players'].add(player_id)
+
+
+def remove_game(season, game_id):
+    game_id = str(game_id)
+    entry = game_entry(season, game_id)
+    if entry is not None:
+        _apply(season, entry['players'], -1)
+        season['games'][game_id] = None
+        season['sources'].pop(game_id, None)
+        season['dirty_games'].add(game_id)
+
+
+def merge_game(season, game_id, counts, source=None):
+    # Add (or replace) one game's counters. O(players in the game).
+    # source describes the file the counts came from, so update_from_games can
+    # tell later whether the game has changed
+    game_id = str(game_id)
+    remove_game(season, game_id)
+    contribution = game_contribution(season, counts)
+    _apply(season, contribution, 1)
+    season['games'][game_id] = {'players': contribution}
+    season['sources'][game_id] = source
+    season['dirty_games'].add(game_id)
+
+
+def merge_game_frame(season, game_id, df, source=None):
+    # merge_game from a parsed game (GameContext.df)
+    merge_game(season, game_id, SEASON_KINDS[season['kind']]['counts'](df), source)
+
+
+def _source_state(game_file):
+    stat = os.stat(game_file)
+    return {'file': game_file, 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def _source_unchanged(recorded, game_file):
+    if not recorded or recorded.get('file') != game_file:
+        return False
+    state = _source_state(game_file)
+    if state['size'] != recorded['size']:
+        return False
+    # Only re-hash files that were touched since they were merged
+    if state['mtime_ns'] == recorded['mtime_ns']:
+        return True
+    return BuildManifest.file_digest(game_file) == recorded['digest']
+
+
+def update_from_games(seasons, games_dir='gamesSorted'):
+    # Merge every game file that is new or changed since it was last merged
+    # into each of the season stores. A game is parsed once however many
+    # stores need it. Returns the ids of the parsed games
+    merged = []
+    for filename in PitchStorage.list_tables(games_dir):
+        game_id = PitchStorage.strip_extension(filename).replace('game_', '')
+        game_file = os.path.join(games_dir, filename)
+        stale = [season for season in seasons if not _source_unchanged(season['sources'].get(game_id), game_file)]
+        if not stale:
+            continue
+
+        game = PitcherResultsGenerator.load_game(game_file, game_id)
+        source = _source_state(game_file)
+        source['digest'] = BuildManifest.file_digest(game_file)
+        for season in stale:
+            merge_game_frame(season, game_id, game.df, source)
+        merged.append(game_id)
+    return merged
+
+
+def player_season_stats(season, player_id):
+    totals = player_totals(season, player_id)
+    stats = SEASON_KINDS[season['kind']]['derive'](int(player_id), totals)
+    stats['Games'] = totals['Games']
+    return stats
+
+
+def season_stats(season):
+    return {int(player_id): player_season_stats(season, player_id) for player_id in player_ids(season)}
+
+
+def write_season_csv(season, output_path=None):
+    output_path = output_path or SEASON_KINDS[season['kind']]['csv_path']
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    with open(output_path, 'w', newline='', encoding='utf-8') as csvfile:
+        writer = csv.DictWriter(csvfile, fieldnames=SEASON_KINDS[season['kind']]['headers'], extrasaction='ignore')
+        writer.writeheader()
+        for stats in season_stats(season).values():
+            writer.writerow(stats)
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Update the season aggregates from the sorted game files')
+    parser.add_argument('--games-dir', default='gamesSorted')
+    parser.add_argument('--kinds', nargs='+', choices=list(SEASON_KINDS), default=list(SEASON_KINDS),
+                        help='season stores to update (default: all)')
+    parser.add_argument('--csv', action='store_true',
+                        help='also rewrite the season results CSV (reads every player of the season)')
+    parser.add_argument('--rebuild', action='store_true', help='clear the season stores and merge every game again')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.games_dir):
+        print(f"Directory {args.games_dir} does not exist")
+        return
+
+    seasons = [load_season(kind) for kind in args.kinds]
+    if args.rebuild:
+        for season in seasons:
+            clear_season(season)
+    merged = update_from_games(seasons, args.games_dir)
+    print(f"Merged {len(merged)} new or changed games")
+    for season in seasons:
+        save_season(season)
+        print(f"{season['kind']}: {len(season['sources'])} games in the season store {season['path']}")
+        if args.csv:
+            print(f"Season results written to '{write_season_csv(season)}'")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import argparse
+import functools
+import json
+import os
+import resource
+import time
+
+# Per-call instrumentation of the pipeline's stage functions. A function
+# decorated with @instrument writes one JSON Lines record per call:
+#   {"stage": "calculate_pitcher_stats", "game": "1", "rows_in": 321, "rows_out": 9,
+#    "wall_s": 0.012, "cpu_s": 0.011, "peak_rss_mb": 98.4, "rss_growth_mb": 0.0, "pid": 4242}
+# Functions add what they know about the call (game, pitcher, row counts) with
+# note(). Nothing is measured unless start() was called, in this process or in
+# the parent of a pool worker (the settings travel in the environment)
+LOG_ENV = 'PITCH_METRICS_LOG'
+PROFILE_ENV = 'PITCH_METRICS_PROFILE'
+
+# Records of the instrumented calls in progress in this process, innermost last
+_active = []
+
+_profile_count = 0
+
+
+def peak_rss_mb():
+    # High-water mark of this process's resident memory (ru_maxrss is KB on Linux)
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def note(**fields):
+    # Attach fields to the record of the innermost instrumented call
+    if _active:
+        _active[-1].update(fields)
+
+
+def write_record(path, record):
+    # One write per line, appended, so pool workers can share the log
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(record, default=str) + '\n')
+
+
+def _start_profile(record, log_path):
+    # Profile only the outermost profiled call: cProfile cannot nest
+    global _profile_count
+    if any('profile' in r for r in _active[:-1]) or not os.environ.get(PROFILE_ENV):
+        return None
+    import cProfile
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        return None
+    _profile_count += 1
+    record['profile'] = os.path.join(profile_dir(log_path), f"{record['stage']}-{os.getpid()}-{_profile_count}.prof")
+    return profiler
+
+
+def instrument(func, profile=True):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        log_path = os.environ.get(LOG_ENV)
+        if not log_path:
+            return func(*args, **kwargs)
+
+        record = {'stage': func.__name__}
+        _active.append(record)
+        profiler = _start_profile(record, log_path) if profile else None
+        rss_before = peak_rss_mb()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            record['error'] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            record['wall_s'] = round(time.perf_counter() - wall_start, 6)
+            record['cpu_s'] = round(time.process_time() - cpu_start, 6)
+            if profiler is not None:
+                profiler.disable()
+                os.makedirs(os.path.dirname(record['profile']), exist_ok=True)
+                profiler.dump_stats(record['profile'])
+            peak = peak_rss_mb()
+            record['peak_rss_mb'] = round(peak, 1)
+            record['rss_growth_mb'] = round(peak - rss_before, 1)
+            record['pid'] = os.getpid()
+            _active.pop()
+            write_record(log_path, record)
+    return wrapper
+
+
+def instrument_stage(func):
+    # instrument for a function that loops over games: measured but never
+    # profiled, so that the instrumented per-game calls inside it are
+    return instrument(func, profile=False)
+
+
+def profile_dir(log_path):
+    return f"{log_path}.profiles"
+
+
+def start(log_path, profile_slowest=0):
+    # Begin a fresh log; with profile_slowest, every outermost profiled call is profiled
+    # and finish() keeps the profiles of the slowest games
+    os.makedirs(os.path.dirname(log_path) or '.', exist_ok=True)
+    open(log_path, 'w').close()
+    os.environ[LOG_ENV] = os.path.abspath(log_path)
+    if profile_slowest:
+        os.environ[PROFILE_ENV] = str(profile_slowest)
+
+
+def read_records(log_path):
+    records = []
+    with open(log_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                records.append(json.loads(line))
+    return records
+
+
+def keep_slowest_profiles(records, slowest):
+    # Delete every profile except those of the `slowest` slowest calls that
+    # processed a game, or of the slowest calls when none noted a game.
+    # Returns the records whose profile was kept
+    profiled = [r for r in records if 'profile' in r]
+    ranked = [r for r in profiled if 'game' in r] or profiled
+    ranked = sorted(ranked, key=lambda r: r['wall_s'], reverse=True)
+    kept = ranked[:slowest]
+    keep_paths = {r['profile'] for r in kept}
+    for record in profiled:
+        if record['profile'] not in keep_paths and os.path.exists(record['profile']):
+            os.remove(record['profile'])
+    return kept
+
+
+def summarize(records):
+    # One row per stage: calls, errors, summed time and rows, worst memory and
+    # the slowest call
+    stages = {}
+    for record in records:
+        row = stages.setdefault(record['stage'], {
+            'calls': 0, 'errors': 0, 'wall_s': 0.0, 'cpu_s': 0.0, 'rows_in': 0, 'rows_out': 0,
+            'peak_rss_mb': 0.0, 'slowest_s': 0.0, 'slowest': ''})
+        row['calls'] += 1
+        row['errors'] += 'error' in record
+        row['wall_s'] += record['wall_s']
+        row['cpu_s'] += record['cpu_s']
+        row['rows_in'] += record.get('rows_in', 0)
+        row['rows_out'] += record.get('rows_out', 0)
+        row['peak_rss_mb'] = max(row['peak_rss_mb'], record['peak_rss_mb'])
+        if record['wall_s'] >= row['slowest_s']:
+            row['slowest_s'] = record['wall_s']
+            row['slowest'] = ' '.join(f"{key}={record[key]}" for key in ('game', 'pitcher') if key in record)
+    return stages
+
+
+def print_summary(records):
+    print(f"{'stage':<26} {'calls':>6} {'errors':>6} {'wall s':>9} {'cpu s':>9} {'rows in':>9} {'rows out':>9} "
+          f"{'peak MB':>8} {'slowest s':>9}  slowest call")
+    for stage, row in summarize(records).items():
+        print(f"{stage:<26} {row['calls']:>6} {row['errors']:>6} {row['wall_s']:>9.3f} {row['cpu_s']:>9.3f} "
+              f"{row['rows_in']:>9} {row['rows_out']:>9} {row['peak_rss_mb']:>8.1f} {row['slowest_s']:>9.3f}  "
+              f"{row['slowest']}")
+
+
+def print_profiles(kept, lines=15):
+    import pstats
+    for record in kept:
+        where = f" game={record['game']}" if 'game' in record else ''
+        print(f"\n{record['stage']}{where} ({record['wall_s']:.3f} s): {record['profile']}")
+        pstats.Stats(record['profile']).sort_stats('cumulative').print_stats(lines)
+
+
+def finish(summary=False):
+    # End the run started by start(): trim the profiles to the slowest games
+    # and optionally print the per-stage summary
+    log_path = os.environ.pop(LOG_ENV, None)
+    slowest = int(os.environ.pop(PROFILE_ENV, 0) or 0)
+    if not log_path:
+        return
+    records = read_records(log_path)
+    if slowest:
+        print_profiles(keep_slowest_profiles(records, slowest))
+    if summary:
+        print_summary(records)
+    print(f"Wrote {len(records)} stage records to '{log_path}'")
+
+
+def add_arguments(parser):
+    # The instrumentation flags every stage script accepts
+    parser.add_argument('--metrics', metavar='PATH',
+                        help='write per-call timings, row counts and peak memory to this JSON Lines file')
+    parser.add_argument('--metrics-summary', action='store_true',
+                        help='print a per-stage summary of the --metrics log at the end')
+    parser.add_argument('--profile-slowest', type=int, default=0, metavar='N',
+                        help='with --metrics, keep cProfile output for the N slowest games')
+
+
+def start_from_args(args):
+    if args.metrics:
+        start(args.metrics, args.profile_slowest)
+
+
+def finish_from_args(args):
+    if args.metrics:
+        finish(args.metrics_summary)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Summarize a stage metrics log')
+    parser.add_argument('log', help='JSON Lines file written with --metrics')
+    parser.add_argument('--slowest', type=int, default=10, help='also list the N slowest calls (default: %(default)s)')
+    args = parser.parse_args()
+
+    records = read_records(args.log)
+    print_summary(records)
+    if args.slowest:
+        print(f"\n{'stage':<26} {'wall s':>9} {'cpu s':>9} {'peak MB':>8}  call")
+        for record in sorted(records, key=lambda r: r['wall_s'], reverse=True)[:args.slowest]:
+            where = ' '.join(f"{key}={record[key]}" for key in ('game', 'pitcher') if key in record)
+            print(f"{record['stage']:<26} {record['wall_s']:>9.3f} {record['cpu_s']:>9.3f} "
+                  f"{record['peak_rss_mb']:>8.1f}  {where}{'  ERROR ' + record['error'] if 'error' in record else ''}")
+
+
+if __name__ == "__main__":
+    main()
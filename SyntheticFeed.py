@@ -0,0 +1,196 @@
+import argparse
+import csv
+import os
+
+import numpy as np
+import pandas as pd
+
+# Generates schema-compatible pitch feeds of any size for benchmarking. Game
+# structure (at-bats, counts, innings, pitcher changes) is simulated; PitchCall
+# follows the bundled feed's distribution, with at-bat-ending calls only on the
+# last pitch of an at-bat; physics columns are bootstrapped from bundled
+# pitches of the same PitchType with a little jitter so they stay correlated
+
+TEMPLATE_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'AnalyticsQuestionnairePitchData.csv')
+
+# Calls that end an at-bat, and the rest
+TERMINAL_CALLS = [
+    'field_out', 'strikeout', 'single', 'walk', 'double', 'force_out', 'field_error',
+    'grounded_into_double_play', 'home_run', 'triple', 'sac_bunt'
+]
+
+# Calls on rows that are not real pitches (no PitchType or tracking data)
+NON_PITCH_CALLS = ['pickoff_attempt_1b', 'stolen_base_2b', 'stolen_base_3b']
+
+# Columns simulated from the game structure rather than bootstrapped
+STRUCTURE_COLUMNS = [
+    'PitchId', 'GamePk', 'PitcherHand', 'PitchCall', 'PitchType', 'BatterId', 'PitcherId', 'BatterSide',
+    'Inning', 'IsTop', 'Balls', 'Strikes', 'Outs', 'PostBalls', 'PostStrikes', 'PostOuts', 'PitchNumber',
+    'AtBatNumber', 'AwayTeamID', 'VenueID', 'HomeTeamID'
+]
+
+PITCHES_PER_GAME = 300
+
+# Relative jitter applied to bootstrapped physics values (fraction of column std)
+PHYSICS_JITTER = 0.05
+
+
+def parse_count(text):
+    # '10k' -> 10000, '1M' -> 1000000
+    text = str(text).strip()
+    multiplier = {'k': 1_000, 'K': 1_000, 'm': 1_000_000, 'M': 1_000_000}.get(text[-1:], 1)
+    return int(float(text.rstrip('kKmM')) * multiplier)
+
+
+def load_template(template_csv=TEMPLATE_CSV):
+    template = pd.read_csv(template_csv)
+    call_counts = template['PitchCall'].value_counts()
+    type_counts = template['PitchType'].value_counts()
+    physics_columns = [c for c in template.columns if c not in STRUCTURE_COLUMNS]
+    pitches = template[template['PitchType'].notna()]
+    return {
+        'columns': list(template.columns),
+        'physics_columns': physics_columns,
+        'terminal_calls': _distribution(call_counts, TERMINAL_CALLS),
+        'other_calls': _distribution(call_counts, [c for c in call_counts.index if c not in TERMINAL_CALLS]),
+        'pitch_types': _distribution(type_counts, list(type_counts.index)),
+        'physics_by_type': {t: rows[physics_columns].to_numpy(dtype=float) for t, rows in pitches.groupby('PitchType')},
+        'physics_std': np.nan_to_num(pitches[physics_columns].std().to_numpy(dtype=float)),
+    }
+
+
+def _distribution(counts, names):
+    names = [n for n in names if n in counts.index]
+    weights = counts[names].to_numpy(dtype=float)
+    return names, weights / weights.sum()
+
+
+def simulate_games(template, rng, first_game, n_games, pitches_per_game, n_pitchers, n_batters):
+    # One DataFrame holding n_games simulated games (rows not yet shuffled)
+
+    # At-bat lengths: 1 + Poisson, trimmed so each game has exactly pitches_per_game rows
+    lengths = 1 + rng.poisson(2.8, size=(n_games, pitches_per_game))
+    ends = np.cumsum(lengths, axis=1)
+    in_game = ends - lengths < pitches_per_game
+    lengths = np.where(in_game, lengths, 0)
+    last = in_game.sum(axis=1) - 1
+    lengths[np.arange(n_games), last] -= ends[np.arange(n_games), last] - pitches_per_game
+    lengths = lengths[lengths > 0]
+
+    n = n_games * pitches_per_game
+    at_bat_of_row = np.repeat(np.arange(len(lengths)), lengths)
+    at_bat_start = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    pitch_number = np.arange(n) - at_bat_start + 1
+    last_pitch = pitch_number == np.repeat(lengths, lengths)
+
+    game_of_row = np.arange(n) // pitches_per_game
+    game_first_at_bat = at_bat_of_row[np.arange(n_games) * pitches_per_game]
+    at_bat_number = at_bat_of_row - game_first_at_bat[game_of_row] + 1
+
+    # Four at-bats per half inning (roughly the bundled games' pace)
+    half_inning = (at_bat_number - 1) // 4
+    inning = half_inning // 2 + 1
+    is_top = (half_inning % 2 == 0).astype(int)
+
+    # Up to four pitchers per team per game: starter, then a change every two innings
+    game_pk = first_game + game_of_row
+    pitcher_slot = (1 - is_top) * 4 + np.minimum((inning - 1) // 2, 3)
+    pitcher_id = (game_pk * 8 + pitcher_slot) % n_pitchers + 1
+    batter_id = ((game_pk * 18 + (1 - is_top) * 9 + (at_bat_number - 1) % 9) % n_batters) + 1
+
+    # Count state before each pitch
+    balls = np.minimum(rng.integers(0, pitch_number), 3)
+    strikes = np.clip(pitch_number - 1 - balls, 0, 2)
+    outs = (at_bat_number - 1) % 4 % 3
+
+    terminal_names, terminal_weights = template['terminal_calls']
+    other_names, other_weights = template['other_calls']
+    pitch_call = np.where(
+        last_pitch,
+        np.array(terminal_names, dtype=object)[rng.choice(len(terminal_names), size=n, p=terminal_weights)],
+        np.array(other_names, dtype=object)[rng.choice(len(other_names), size=n, p=other_weights)],
+    )
+    is_pitch = ~np.isin(pitch_call, NON_PITCH_CALLS)
+
+    type_names, type_weights = template['pitch_types']
+    pitch_type = np.array(type_names, dtype=object)[rng.choice(len(type_names), size=n, p=type_weights)]
+
+    # Bootstrap physics per pitch type, with jitter; non-pitch rows have no tracking data
+    physics = np.full((n, len(template['physics_columns'])), np.nan)
+    for name in type_names:
+        rows = np.flatnonzero((pitch_type == name) & is_pitch)
+        source = template['physics_by_type'][name]
+        physics[rows] = source[rng.integers(0, len(source), size=len(rows))]
+    physics += rng.normal(size=physics.shape) * template['physics_std'] * PHYSICS_JITTER
+    pitch_type = np.where(is_pitch, pitch_type, None)
+
+    home_team = game_pk % 30 + 1
+    columns = {
+        'PitchId': np.arange(n) + (first_game - 1) * pitches_per_game + 1,
+        'GamePk': game_pk,
+        'PitcherHand': np.where(pitcher_id % 3 == 0, 'L', 'R'),
+        'PitchCall': pitch_call,
+        'PitchType': pitch_type,
+        'BatterId': batter_id,
+        'PitcherId': pitcher_id,
+        'BatterSide': np.where(batter_id % 5 < 2, 'L', 'R'),
+        'Inning': inning,
+        'IsTop': is_top,
+        'Balls': balls,
+        'Strikes': strikes,
+        'Outs': outs,
+        'PostBalls': balls + (pitch_call == 'ball'),
+        'PostStrikes': np.minimum(strikes + np.isin(pitch_call, ['called_strike', 'swinging_strike', 'foul']), 3),
+        'PostOuts': np.minimum(outs + np.isin(pitch_call, ['field_out', 'strikeout', 'force_out']), 3),
+        'PitchNumber': pitch_number,
+        'AtBatNumber': at_bat_number,
+        'AwayTeamID': (home_team + 7) % 30 + 1,
+        'VenueID': home_team,
+        'HomeTeamID': home_team,
+    }
+    for index, column in enumerate(template['physics_columns']):
+        columns[column] = physics[:, index]
+    return pd.DataFrame(columns)[template['columns']]
+
+
+def generate_synthetic_feed(path, n_pitches, n_games=None, n_pitchers=None, n_batters=None, seed=0,
+                            games_per_chunk=500, template_csv=TEMPLATE_CSV):
+    # Write an n_pitches-row feed to path, one chunk of games at a time so memory
+    # stays bounded. Rows are shuffled within each chunk, like an unsorted feed
+    if n_games is None:
+        n_games = max(1, n_pitches // PITCHES_PER_GAME)
+    if n_pitchers is None:
+        n_pitchers = max(2, min(400, n_games * 8))
+    if n_batters is None:
+        n_batters = max(18, min(1200, n_games * 18))
+    pitches_per_game = max(1, n_pitches // n_games)
+
+    template = load_template(template_csv)
+    rng = np.random.default_rng(seed)
+
+    with open(path, 'w', newline='') as out:
+        csv.writer(out).writerow(template['columns'])
+        for first_game in range(1, n_games + 1, games_per_chunk):
+            games = min(games_per_chunk, n_games - first_game + 1)
+            chunk = simulate_games(template, rng, first_game, games, pitches_per_game, n_pitchers, n_batters)
+            chunk = chunk.iloc[rng.permutation(len(chunk))]
+            chunk.to_csv(out, header=False, index=False, float_format='%.10g', lineterminator='\r\n')
+
+    return n_games * pitches_per_game
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate a synthetic pitch feed with the bundled feed schema')
+    parser.add_argument('output')
+    parser.add_argument('--pitches', default='10k', help='number of pitches, e.g. 10k, 1M (default: %(default)s)')
+    parser.add_argument('--games', type=int, help='number of games (default: one per 300 pitches)')
+    parser.add_argument('--pitchers', type=int, help='size of the pitcher pool')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rows = generate_synthetic_feed(args.output, parse_count(args.pitches), args.games, args.pitchers, seed=args.seed)
+    print(f"Wrote {rows} synthetic pitches to '{args.output}'")
+
+
+if __name__ == "__main__":
+    main()